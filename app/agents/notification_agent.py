@@ -14,10 +14,12 @@ Prompt 文件:
   - prompts/agents/notification_periodic.txt  (早/中/晚/睡前，含 should_send 决策)
   - prompts/agents/notification_event.txt     (事件开始前，始终发送)
 """
+import hashlib
 import json
 import logging
+import time
 from pathlib import Path
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime
 
 from app.services.llm import llm_service
@@ -48,11 +50,18 @@ def _load_prompt(filename: str) -> str:
 class NotificationAgent:
     """智能推送文案生成引擎"""
 
+    # 定时节点 LLM 决策的缓存时长（秒）：重试 / force 重跑同一节点时不再重复调用 LLM
+    PERIODIC_CACHE_TTL = 3600
+    # 缓存条目超过该数量时清理过期条目
+    PERIODIC_CACHE_PRUNE_SIZE = 1024
+
     def __init__(self):
         self.llm = llm_service
         # 从外部文件加载提示词
         self._periodic_prompt = _load_prompt("notification_periodic.txt")
         self._event_prompt = _load_prompt("notification_event.txt")
+        # sha256(用户, 节点, 事件, 上下文, Checklist) → (缓存时间戳, 解析后的 LLM 决策)
+        self._periodic_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
 
     # ==================== 定时节点推送 ====================
 
@@ -82,39 +91,65 @@ class NotificationAgent:
                 "reasoning": str
             }
         """
+        # 收集 Checklist（身份/灵魂/记忆），一并计入缓存 key
+        checklist = self._load_periodic_checklist(user_id)
+
+        # 同一用户、同一节点、输入未变时直接复用上次的决策和文案（仍会正常发送）
+        cache_key = self._periodic_cache_key(user_id, period, events, recent_context, checklist)
+        cached = self._periodic_cache.get(cache_key)
+        if cached and (time.monotonic() - cached[0]) < self.PERIODIC_CACHE_TTL:
+            result = dict(cached[1])
+            logger.info(f"NotificationAgent [{period}] for user {user_id}: reusing cached decision")
+        else:
+            result = await self._decide_periodic_notification(
+                user_id, period, events, recent_context, current_time, checklist
+            )
+            self._store_periodic_result(cache_key, result)
+
+        # 如果决定发送
+        if result.get("should_send") and result.get("body"):
+            await self._send_and_inject(
+                user_id=user_id,
+                title=result.get("title", "UniLife"),
+                body=result["body"],
+                notification_type=NotificationType.GREETING,
+                category=f"{period.upper()}_NOTIFICATION",
+                data={
+                    "type": f"{period}_notification",
+                    "source": "notification_agent",
+                    "action": "open_today"
+                }
+            )
+
+        return result
+
+    async def _decide_periodic_notification(
+        self,
+        user_id: str,
+        period: str,
+        events: List[Dict],
+        recent_context: str,
+        current_time: Optional[str],
+        checklist: Dict[str, str]
+    ) -> Dict[str, Any]:
+        """基于已收集的 Checklist 调用 LLM，返回解析后的 should_send / title / body 决策"""
         import pytz
         user_tz = pytz.timezone("Asia/Shanghai")
         now = datetime.now(user_tz)
         current_time = current_time or now.strftime("%Y-%m-%d %H:%M")
 
-        # 收集 Checklist
-        identity = identity_service.get_identity(user_id)
-        soul_content = soul_service.get_soul(user_id)
-
-        # 分层记忆：长期（关于用户）+ 短期（近期日记）
-        long_term_memory = memory_service.get_long_term_memory(user_id)
-        recent_memory = memory_service.get_recent_diary(user_id, days=3)
-        memory_parts = []
-        if long_term_memory:
-            memory_parts.append(f"### 关于用户\n\n{long_term_memory}")
-        if recent_memory:
-            memory_parts.append(f"### 近期日记\n\n{recent_memory}")
-        memory_content = "\n\n---\n\n".join(memory_parts) if memory_parts else "（暂无记忆）"
-
         # 格式化事件列表
         events_str = self._format_events(events) if events else "（本时段暂无日程）"
 
         # 渲染 prompt（从外部 txt 文件加载）
+        # 模板按 规则 → 身份/灵魂/记忆 → 对话上下文（只在末尾追加）→ 时间/节点/事件 排列，
+        # 同一用户一天内的多次调用共享尽可能长的前缀，便于模型服务端做前缀缓存
         prompt = self._periodic_prompt.format(
+            **checklist,
+            recent_context=recent_context or "（最近没有对话）",
             current_time=current_time,
             notification_type=self._period_label(period),
-            agent_name=identity.name or "UniLife",
-            agent_emoji=identity.emoji or "🤖",
-            agent_vibe=identity.vibe or "友好",
-            soul_content=soul_content or "（尚未形成）",
-            memory_content=memory_content,
-            today_events=events_str,
-            recent_context=recent_context or "（最近没有对话）"
+            today_events=events_str
         )
 
         messages = [
@@ -135,23 +170,58 @@ class NotificationAgent:
             f"should_send={result.get('should_send', False)}"
         )
 
-        # 如果决定发送
-        if result.get("should_send") and result.get("body"):
-            await self._send_and_inject(
-                user_id=user_id,
-                title=result.get("title", "UniLife"),
-                body=result["body"],
-                notification_type=NotificationType.GREETING,
-                category=f"{period.upper()}_NOTIFICATION",
-                data={
-                    "type": f"{period}_notification",
-                    "source": "notification_agent",
-                    "action": "open_today"
-                }
-            )
-
         return result
 
+    @staticmethod
+    def _load_periodic_checklist(user_id: str) -> Dict[str, str]:
+        """收集定时节点 prompt 所需的身份 / 灵魂 / 记忆字段"""
+        identity = identity_service.get_identity(user_id)
+        soul_content = soul_service.get_soul(user_id)
+
+        # 分层记忆：长期（关于用户）+ 短期（近期日记）
+        long_term_memory = memory_service.get_long_term_memory(user_id)
+        recent_memory = memory_service.get_recent_diary(user_id, days=3)
+        memory_parts = []
+        if long_term_memory:
+            memory_parts.append(f"### 关于用户\n\n{long_term_memory}")
+        if recent_memory:
+            memory_parts.append(f"### 近期日记\n\n{recent_memory}")
+        memory_content = "\n\n---\n\n".join(memory_parts) if memory_parts else "（暂无记忆）"
+
+        return {
+            "agent_name": identity.name or "UniLife",
+            "agent_emoji": identity.emoji or "🤖",
+            "agent_vibe": identity.vibe or "友好",
+            "soul_content": soul_content or "（尚未形成）",
+            "memory_content": memory_content,
+        }
+
+    @staticmethod
+    def _periodic_cache_key(
+        user_id: str,
+        period: str,
+        events: List[Dict],
+        recent_context: str,
+        checklist: Dict[str, str]
+    ) -> str:
+        """定时节点决策的缓存 key（含 soul / 记忆等 Checklist，不含当前时间，同一小时内的重跑可命中）"""
+        payload = json.dumps(
+            {"user": user_id, "period": period, "events": events, "ctx": recent_context,
+             "checklist": checklist},
+            sort_keys=True, default=str, ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _store_periodic_result(self, cache_key: str, result: Dict[str, Any]) -> None:
+        """写入决策缓存，条目过多时顺带清理过期条目"""
+        now = time.monotonic()
+        if len(self._periodic_cache) >= self.PERIODIC_CACHE_PRUNE_SIZE:
+            self._periodic_cache = {
+                key: entry for key, entry in self._periodic_cache.items()
+                if now - entry[0] < self.PERIODIC_CACHE_TTL
+            }
+        self._periodic_cache[cache_key] = (now, dict(result))
+
     # ==================== 事件开始前提醒 ====================
 
     async def generate_event_reminder(
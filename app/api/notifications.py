@@ -314,18 +314,12 @@ async def trigger_daily_notification(
     """
     from app.scheduler.daily_notifications import daily_notification_scheduler
     
-    result = False
-    
-    if type == "morning_briefing":
-        result = await daily_notification_scheduler.send_morning_briefing(user_id, force=force)
-    elif type == "afternoon_checkin":
-        result = await daily_notification_scheduler.send_afternoon_checkin(user_id, force=force)
-    elif type == "evening_switch":
-        result = await daily_notification_scheduler.send_evening_switch(user_id, force=force)
-    elif type == "closing_ritual":
-        result = await daily_notification_scheduler.send_closing_ritual(user_id, force=force)
-    else:
+    if type not in daily_notification_scheduler.PERIOD_SENDERS:
         raise HTTPException(status_code=400, detail="Invalid notification type")
+
+    # Debug triggers usually follow an edit; don't serve events from the short-lived cache
+    daily_notification_scheduler.clear_event_cache(user_id)
+    result = await daily_notification_scheduler.send_for_period(user_id, type, force=force)
         
     return {
         "type": type,
@@ -446,17 +440,11 @@ async def trigger_daily_notification_last_device(type: str):
         user_id = row[0]
         print(f"[Debug] Triggering {type} for user {user_id}...")
         
-        result = False
-        if type == "morning_briefing":
-            result = await daily_notification_scheduler.send_morning_briefing(user_id, force=True)
-        elif type == "afternoon_checkin":
-            result = await daily_notification_scheduler.send_afternoon_checkin(user_id, force=True)
-        elif type == "evening_switch":
-            result = await daily_notification_scheduler.send_evening_switch(user_id, force=True)
-        elif type == "closing_ritual":
-            result = await daily_notification_scheduler.send_closing_ritual(user_id, force=True)
-        else:
+        if type not in daily_notification_scheduler.PERIOD_SENDERS:
             raise HTTPException(status_code=400, detail="Invalid notification type")
+
+        daily_notification_scheduler.clear_event_cache(user_id)
+        result = await daily_notification_scheduler.send_for_period(user_id, type, force=True)
             
         return {
             "type": type,
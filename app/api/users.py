@@ -338,6 +338,10 @@ async def update_notification_settings(
     # 保存更新后的 profile
     profile_service.save_profile(user_field_id, user_profile)
 
+    # 作息时间可能变化，让调度器重建通知触发表
+    from app.scheduler.background_tasks import task_scheduler
+    task_scheduler.invalidate_notification_schedule()
+
     return settings
 
 
@@ -55,6 +55,9 @@ class Settings(BaseSettings):
     apns_bundle_id: Optional[str] = None       # App bundle identifier
     apns_use_sandbox: bool = True              # Use sandbox (development) or production
 
+    # Scheduler
+    daily_notification_concurrency: int = 32   # Max concurrent NotificationAgent generations for daily notifications
+
     # Logging
     log_level: str = "INFO"
 
@@ -2,35 +2,216 @@
 Background Tasks - 定时任务调度器 (简化版)
 使用 APScheduler 实现定时任务
 """
-from typing import Optional, List
+from typing import Optional, List, Dict, NamedTuple, Set, Tuple, Callable, Any
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date, timedelta
 import asyncio
+import functools
+import logging
+import re
+import time
 import pytz
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from sqlalchemy import text
 
 from app.agents.observer import observer_agent
 from app.agents.proactive_check import proactive_check_agent
 from app.scheduler.daily_notifications import daily_notification_scheduler
+from app.scheduler.db import (
+    acquire_scheduler_lock, ensure_scheduler_indexes, get_apple_id, get_apple_ids, get_engine,
+    get_consolidated_users, get_profiles_version, get_sent_reminders, mark_consolidated,
+    mark_reminder_sent, purge_scheduler_locks, purge_sent_reminders
+)
+
+logger = logging.getLogger("scheduler")
+
+# ---- 每分钟执行的 SQL，模块加载时构造一次，各轮 tick 复用 ----
+
+# 事件提醒：start_time 落在提醒窗口内、开启了事件提醒的未完成真实事件（提醒设置从 user_profiles 取）
+# start_time 按字符串区间比较：events 只经 ORM 的 DateTime 列写入，存储格式固定为
+# "YYYY-MM-DD HH:MM:SS[.ffffff]"（空格分隔、无时区），字典序即时间序；"T" 分隔的 ISO 字符串不会落库
+_REMINDER_EVENTS_SQL = """
+    SELECT e.id, e.user_id, e.title, e.start_time, e.event_date, u.user_id as profile_user_id,
+           json_extract(p.profile_data, '$.preferences.event_reminder_minutes') as reminder_minutes
+    FROM events e
+    LEFT JOIN users u ON e.user_id = u.id
+    LEFT JOIN user_profiles p ON p.user_id = COALESCE(u.user_id, e.user_id)
+    WHERE e.start_time > :remind_from AND e.start_time < :remind_until
+    AND e.status IN ('PENDING', 'IN_PROGRESS')
+    AND e.is_template = 0
+    AND COALESCE(json_extract(p.profile_data, '$.preferences.event_reminders_enabled'), 1) = 1
+"""
+
+# 事件提醒：需要虚拟展开的模板事件
+_REMINDER_TEMPLATES_SQL = """
+    SELECT e.id, e.user_id, e.title, e.start_time, e.event_date,
+           e.repeat_pattern, e.duration, e.time_period, e.event_type,
+           e.category, e.created_at, e.project_id,
+           u.user_id as profile_user_id,
+           json_extract(p.profile_data, '$.preferences.event_reminder_minutes') as reminder_minutes
+    FROM events e
+    LEFT JOIN users u ON e.user_id = u.id
+    LEFT JOIN user_profiles p ON p.user_id = COALESCE(u.user_id, e.user_id)
+    WHERE e.is_template = 1
+    AND e.status <> 'CANCELLED'
+    AND COALESCE(json_extract(p.profile_data, '$.preferences.event_reminders_enabled'), 1) = 1
+"""
+
+# 事件提醒：重复事件在窗口内已存在的真实实例（避免重复展开）
+_ROUTINE_INSTANCES_SQL = """
+    SELECT id, user_id, parent_routine_id as parent_event_id, event_date
+    FROM events
+    WHERE is_template = 0
+    AND parent_routine_id IS NOT NULL
+    AND event_date >= :window_start AND event_date < :window_end
+"""
+
+# 近 7 天活跃用户；id 是主键，无需 DISTINCT
+_ACTIVE_USERS_SQL = text("""
+    SELECT id FROM users
+    WHERE last_active_at >= :since OR created_at >= :since
+""")
+
+# 调度器统一使用北京时间；模块级常量，避免每次调用都查找/构造时区对象
+SHANGHAI_TZ = pytz.timezone("Asia/Shanghai")
+
+# start_time 的存储格式 "YYYY-MM-DD HH:MM[:SS[.ffffff]]"，以及可选的 Z / ±HH:MM 时区后缀，
+# 直接按分组构造 datetime
+_START_TIME_RE = re.compile(
+    r"(\d{4})-(\d{2})-(\d{2})[ T](\d{2}):(\d{2})(?::(\d{2})(?:\.(\d{1,6})\d*)?)?"
+    r"(Z|[+-]\d{2}:?\d{2})?"
+)
+
+
+class EventReminder(NamedTuple):
+    """一条待发送的事件提醒（_collect_event_reminders 的结果）"""
+    event_id: str
+    user_id: str
+    title: str
+    reminder_minutes: int
+    minutes_until: int
+    delay_seconds: float  # 距准点发送还需等待的秒数，0 表示立即发送
+    event_time: str = ""  # 事件开始时间 YYYYmmddHHMM；delay_seconds > 0 时到点后才用它登记 sent_reminders
+
+
+@functools.lru_cache(maxsize=64)
+def _day_bounds(d: date) -> Tuple[str, str]:
+    """北京时间某一天对应的 UTC 半开区间 [当天 00:00, 次日 00:00)
+
+    DB 中时间戳是 UTC 格式 "YYYY-MM-DD HH:MM:SS"，返回值可直接作为查询参数。
+    """
+    start_local = datetime.combine(d, datetime.min.time())
+    end_local = datetime.combine(d + timedelta(days=1), datetime.min.time())
+    start_utc = SHANGHAI_TZ.localize(start_local).astimezone(pytz.UTC).strftime("%Y-%m-%d %H:%M:%S")
+    end_utc = SHANGHAI_TZ.localize(end_local).astimezone(pytz.UTC).strftime("%Y-%m-%d %H:%M:%S")
+    return start_utc, end_utc
 
 
 class BackgroundTaskScheduler:
     """后台任务调度器(简化版)"""
 
+    # 近 7 天活跃用户列表缓存有效期（秒）；活跃集合变化缓慢，每分钟任务共享
+    ACTIVE_USERS_TTL = 120
+
+    # 按日期的活跃用户列表缓存有效期（秒）
+    ACTIVE_USERS_FOR_DATE_TTL = 24 * 60 * 60
+    ACTIVE_USERS_FOR_DATE_CACHE_SIZE = 8
+
+    # 事件提前提醒分钟数上限（与 NotificationSettings.event_reminder_minutes 的 le=120 一致），
+    # 决定每轮需要从 DB 取出的事件时间窗口
+    MAX_EVENT_REMINDER_MINUTES = 120
+
+    # 错过触发时间后仍允许补跑的宽限期（秒）
+    # 每日/每周任务允许 1 小时内补跑；每分钟任务超过 30 秒就交给下一轮
+    DAILY_MISFIRE_GRACE_TIME = 3600
+    MINUTELY_MISFIRE_GRACE_TIME = 30
+
+    # 同时进行的 proactive check LLM 调用数上限（避免瞬间打满 LLM 接口）
+    USER_CHECK_CONCURRENCY = 16
+
+    # 同时生成/发送的事件提醒数上限（每条提醒是一次 LLM 调用 + 推送）
+    EVENT_REMINDER_CONCURRENCY = 8
+
+    # 每日复盘同时处理的用户数上限（每个用户的复盘都是一次独立的 LLM 调用）
+    DAILY_REVIEW_CONCURRENCY = 4
+
+    # 同步 SQLite 查询使用的线程池大小
+    IO_POOL_WORKERS = 4
+
+    # 记忆精炼周期（天）：周期内已精炼过的用户在重跑时跳过
+    CONSOLIDATION_INTERVAL_DAYS = 6
+
+    # get_job_status 任务列表快照有效期（秒），避免高频轮询反复遍历 jobstore
+    JOB_STATUS_TTL = 1.0
+
     def __init__(self):
         self.scheduler: Optional[AsyncIOScheduler] = None
         self.notification_scheduler = daily_notification_scheduler
 
+        # (缓存时间戳, 近 7 天活跃用户列表)
+        self._active_users_cache: Optional[Tuple[float, List[str]]] = None
+
+        # target_date → (缓存时间戳, 用户列表)，同一天的多个任务共享一次查询
+        self._active_users_for_date_cache: Dict[date, Tuple[float, List[str]]] = {}
+
+        # 限制同时进行的 proactive check LLM 调用数
+        self._user_check_semaphore = asyncio.Semaphore(self.USER_CHECK_CONCURRENCY)
+
+        # 限制同时进行的事件提醒生成/发送数
+        self._event_reminder_semaphore = asyncio.Semaphore(self.EVENT_REMINDER_CONCURRENCY)
+
+        # 脱离每分钟 tick 在后台运行的 LLM 任务（保留强引用，防止被 GC 回收）
+        self._background_tasks: Set[asyncio.Task] = set()
+
+        # (缓存时间戳, user_profiles 版本戳, 一天中的第几分钟 → [(user_id, check_type), ...])，
+        # 每分钟只需一次字典查找
+        self._notification_schedule: Optional[
+            Tuple[float, Optional[str], Dict[int, List[Tuple[str, str]]]]
+        ] = None
+
+        # (模板 ID, repeat_pattern 原文) → 解析后的 dict；原文不变则无需重新 json.loads
+        self._repeat_pattern_cache: Dict[Tuple[str, str], dict] = {}
+
+        # 上一次成功完成通知检查的分钟（"YYYYMMDDHHMM"），同一分钟被重复触发时直接跳过
+        self._last_minute_checked: Optional[str] = None
+
+        # 正在精炼记忆的用户，防止同一用户被并发精炼
+        self._active_consolidations: Set[str] = set()
+
+        # 同步 DB 查询专用线程池（start 时创建，stop 时关闭）
+        self._io_pool: Optional[ThreadPoolExecutor] = None
+
+        # (快照时间戳, 序列化后的任务列表)；start/stop 时失效
+        self._jobs_snapshot: Optional[Tuple[float, List[dict]]] = None
+
     def start(self):
         """启动调度器"""
         if self.scheduler and self.scheduler.running:
-            print("[Scheduler] Already running, skipping...")
+            logger.info("Already running, skipping...")
             return
 
-        print("[Scheduler] Starting background task scheduler...")
+        logger.info("Starting background task scheduler...")
 
-        self.scheduler = AsyncIOScheduler()
+        ensure_scheduler_indexes()
+
+        if self._io_pool is None:
+            self._io_pool = ThreadPoolExecutor(
+                max_workers=self.IO_POOL_WORKERS,
+                thread_name_prefix="sched-db"
+            )
+
+        # coalesce: 积压的多次触发合并为一次; max_instances: 同一任务不允许并行重入;
+        # misfire_grace_time: 未单独指定的任务按每分钟任务的宽限期处理。
+        # 任务是启动时注册的固定三个绑定方法，保留默认的内存 jobstore
+        self.scheduler = AsyncIOScheduler(
+            job_defaults={
+                "coalesce": True,
+                "max_instances": 1,
+                "misfire_grace_time": self.MINUTELY_MISFIRE_GRACE_TIME,
+            }
+        )
 
         # 每日凌晨 3:00 观察者统一复盘 (写日记 + 更新认知)
         self.scheduler.add_job(
@@ -38,32 +219,16 @@ class BackgroundTaskScheduler:
             trigger=CronTrigger(hour=3, minute=0, timezone="Asia/Shanghai"),
             id="daily_observer_review",
             name="Daily Observer Review",
+            misfire_grace_time=self.DAILY_MISFIRE_GRACE_TIME,
             replace_existing=True
         )
-        # 每分钟检查并发送用户个性化通知
+        # 每分钟 tick：用户个性化通知 / 待发送通知 / 事件提醒 三个子任务并发执行
         self.scheduler.add_job(
-            self._check_and_send_notifications,
+            self._minutely_tick,
             trigger=CronTrigger(minute="*", timezone="Asia/Shanghai"),  # 每分钟
-            id="check_user_notifications",
-            name="Check and Send User Notifications",
-            replace_existing=True
-        )
-        
-        # 每分钟处理待发送的定时通知(Event Reminders)
-        self.scheduler.add_job(
-            self._process_pending_notifications,
-            trigger=CronTrigger(minute="*", timezone="Asia/Shanghai"),  # 每分钟
-            id="process_pending_notifications",
-            name="Process Pending Notifications",
-            replace_existing=True
-        )
-        
-        # 每分钟检查即将开始的事件并发送提醒
-        self.scheduler.add_job(
-            self._check_event_reminders,
-            trigger=CronTrigger(minute="*", timezone="Asia/Shanghai"),  # 每分钟
-            id="check_event_reminders",
-            name="Check Event Reminders",
+            id="minutely_tick",
+            name="Minutely Notification Tick",
+            misfire_grace_time=self.MINUTELY_MISFIRE_GRACE_TIME,
             replace_existing=True
         )
         
@@ -73,393 +238,550 @@ class BackgroundTaskScheduler:
             trigger=CronTrigger(day_of_week="sun", hour=4, minute=0, timezone="Asia/Shanghai"),
             id="consolidate_memories",
             name="Weekly Memory Consolidation",
+            misfire_grace_time=self.DAILY_MISFIRE_GRACE_TIME,
             replace_existing=True
         )
 
         self.scheduler.start()
-        print("[Scheduler] Background tasks scheduler started successfully")
-        print("[Scheduler] Scheduled jobs:")
+        self._jobs_snapshot = None
+        logger.info("Background tasks scheduler started successfully")
+        logger.info("Scheduled jobs:")
         for job in self.scheduler.get_jobs():
-            print(f"  - {job.name} (ID: {job.id}, Next run: {job.next_run_time})")
+            logger.info("  - %s (ID: %s, Next run: %s)", job.name, job.id, job.next_run_time)
 
     def stop(self):
         """停止调度器"""
         if self.scheduler and self.scheduler.running:
-            print("[Scheduler] Stopping background task scheduler...")
+            logger.info("Stopping background task scheduler...")
             self.scheduler.shutdown(wait=False)
-            print("[Scheduler] Scheduler stopped")
+            logger.info("Scheduler stopped")
+        if self._io_pool is not None:
+            self._io_pool.shutdown(wait=False, cancel_futures=True)
+            self._io_pool = None
+        for task in list(self._background_tasks):
+            task.cancel()
+        self._active_users_for_date_cache.clear()
+        self._repeat_pattern_cache.clear()
+        self._active_users_cache = None
+        self._notification_schedule = None
+        self._jobs_snapshot = None
+
+    async def _run_io(self, func: Callable[..., Any], *args) -> Any:
+        """在 DB 线程池中执行同步查询，避免阻塞事件循环
+
+        调度器未启动（如 serverless 直接调用）时退回 asyncio.to_thread。
+        """
+        if self._io_pool is None:
+            return await asyncio.to_thread(func, *args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._io_pool, func, *args)
 
     async def _daily_review(self):
         """每日观察者复盘任务"""
-        print(f"[Scheduler] Running daily observer review at {datetime.now()}")
+        logger.info("Running daily observer review at %s", datetime.now())
+
+        # 长期运行的调度器进程每天清理一次过期的防重锁和提醒去重记录
+        purged = await self._run_io(purge_scheduler_locks)
+        if purged:
+            logger.info("Purged %d expired scheduler locks", purged)
+        purged = await self._run_io(purge_sent_reminders)
+        if purged:
+            logger.info("Purged %d expired sent reminders", purged)
 
         try:
             target_date = date.today() - timedelta(days=1)
-            user_ids = self._get_active_users_for_date(target_date)
+            user_ids = await self._run_io(self._get_active_users_for_date, target_date)
 
-            reviewed_count = 0
-            failed_count = 0
+            date_str = target_date.strftime("%Y-%m-%d")
+            # 各用户的复盘互不依赖，并发执行；信号量限制同时在途的 LLM 调用数
+            semaphore = asyncio.Semaphore(self.DAILY_REVIEW_CONCURRENCY)
 
-            for user_id in user_ids:
-                try:
-                    await observer_agent.daily_review(
-                        user_id=user_id,
-                        date_str=target_date.strftime("%Y-%m-%d")
-                    )
-                    reviewed_count += 1
-                    print(f"[Scheduler] Daily review completed for user {user_id}")
-                except Exception as e:
-                    failed_count += 1
-                    print(f"[Scheduler] Error reviewing user {user_id}: {e}")
+            async def review_one(user_id: str) -> bool:
+                async with semaphore:
+                    try:
+                        await observer_agent.daily_review(user_id=user_id, date_str=date_str)
+                        logger.info("Daily review completed for user %s", user_id)
+                        return True
+                    except Exception as e:
+                        logger.error("Error reviewing user %s: %s", user_id, e)
+                        return False
 
-            print(f"[Scheduler] Daily review finished: "
-                  f"{reviewed_count} success, {failed_count} failed")
+            results = await asyncio.gather(*(review_one(uid) for uid in user_ids))
+            reviewed_count = sum(results)
+            failed_count = len(results) - reviewed_count
+
+            logger.info("Daily review finished: %d success, %d failed",
+                        reviewed_count, failed_count)
 
         except Exception as e:
-            print(f"[Scheduler] Error in daily review task: {e}")
+            logger.error("Error in daily review task: %s", e)
 
     async def _consolidate_memories(self):
         """每周记忆精炼任务"""
-        print(f"[Scheduler] Running weekly memory consolidation at {datetime.now()}")
+        logger.info("Running weekly memory consolidation at %s", datetime.now())
         try:
-            user_ids = self._get_all_active_users()
+            user_ids = await self._run_io(self._get_all_active_users)
+
+            # 断点续跑：本周期内已经精炼过的用户直接跳过
+            since = (datetime.utcnow() - timedelta(days=self.CONSOLIDATION_INTERVAL_DAYS)).strftime("%Y-%m-%d %H:%M:%S")
+            already_done = await self._run_io(get_consolidated_users, since)
+
             consolidated = 0
             for user_id in user_ids:
+                if user_id in already_done:
+                    continue
+                if user_id in self._active_consolidations:
+                    logger.info("Memory consolidation already running for %s, skipping", user_id)
+                    continue
+                self._active_consolidations.add(user_id)
                 try:
                     result = await observer_agent.consolidate_memory(user_id)
                     if result:
                         consolidated += 1
+                    # 无论是否有可精炼的旧日记，都记为本周期已处理
+                    await self._run_io(mark_consolidated, user_id)
                 except Exception as e:
-                    print(f"[Scheduler] Error consolidating memory for {user_id}: {e}")
+                    logger.error("Error consolidating memory for %s: %s", user_id, e)
+                finally:
+                    self._active_consolidations.discard(user_id)
 
-            print(f"[Scheduler] Memory consolidated for {consolidated} users")
+            logger.info("Memory consolidated for %d users", consolidated)
         except Exception as e:
-            print(f"[Scheduler] Error in memory consolidation task: {e}")
+            logger.error("Error in memory consolidation task: %s", e)
+
+    async def _minutely_tick(self):
+        """
+        每分钟任务入口
 
-    async def _check_and_send_notifications(self):
+        三个子任务互不依赖，合并为一个 job 后只需一次调度分发，并用 gather 并发执行；
+        子任务各自捕获异常，这里再兜底一次，避免某一个失败影响其余两个。
+        本轮只取一次当前时间，三个子任务共用，保证同一 tick 内时间窗口一致。
+        """
+        tick_time = datetime.now(SHANGHAI_TZ)
+        results = await asyncio.gather(
+            self._check_and_send_notifications(tick_time),
+            self._process_pending_notifications(tick_time),
+            self._check_event_reminders(tick_time),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error("Error in minutely tick: %s", result)
+
+    async def _check_and_send_notifications(self, tick_time: Optional[datetime] = None):
         """
         每分钟检查所有用户的通知时间点
         
-        由于每个用户的作息时间不同,需要逐个检查
+        每个用户的作息时间不同，预先按一天中的分钟数建好触发表，每分钟只处理到点的用户
         注意: 使用 Asia/Shanghai 时区，确保在 UTC 服务器上也能按北京时间触发
+
+        Args:
+            tick_time: 本轮 tick 的北京时间（aware），缺省时取当前时间
         """
-        user_tz = pytz.timezone("Asia/Shanghai")
-        current_time = datetime.now(user_tz)
-        current_hm = current_time.strftime("%H:%M")
+        current_time = tick_time or datetime.now(SHANGHAI_TZ)
+        minute_of_day = current_time.hour * 60 + current_time.minute
+
+        # 触发器在 :00 附近抖动/时钟回拨时可能同一分钟触发两次，已成功处理过的分钟直接跳过
+        current_minute = current_time.strftime("%Y%m%d%H%M")
+        if self._last_minute_checked == current_minute:
+            return
         
-        # 只在整分钟时记录日志,避免刷屏
-        if current_time.second < 5:
-            print(f"[Scheduler] Checking notifications at {current_hm}")
+        # 每分钟都会执行，只在 DEBUG 级别记录
+        logger.debug("Checking notifications at %02d:%02d", current_time.hour, current_time.minute)
         
         try:
-            # 获取所有活跃用户 (返回 UUID)
-            user_ids = self._get_all_active_users()
-            
-            for user_id in user_ids:
-                await self._check_user_notifications(user_id, current_hm, current_time)
+            # 按一天中的分钟数预先建好的触发表，绝大多数分钟直接命中空列表
+            schedule = await self._run_io(self._get_notification_schedule)
+            due = schedule.get(minute_of_day)
+            if due:
+                today_str = current_time.strftime("%Y%m%d")
+                await asyncio.gather(
+                    *(self._check_user_notifications(user_id, check_type, today_str)
+                      for user_id, check_type in due),
+                    return_exceptions=True
+                )
+
+            # 只在成功后记录，出错的分钟允许重试
+            self._last_minute_checked = current_minute
                 
         except Exception as e:
-            print(f"[Scheduler] Error checking notifications: {e}")
+            logger.error("Error checking notifications: %s", e)
+
+    def _get_notification_schedule(self) -> Dict[int, List[Tuple[str, str]]]:
+        """获取 分钟数 → [(user_id, check_type), ...] 触发表，缓存 ACTIVE_USERS_TTL 秒
+
+        调度器可能独立于 API 进程运行，收不到 invalidate_notification_schedule()，
+        因此每次还比对 user_profiles 的版本戳（MAX(updated_at)，走索引），设置有变化时立即重建。
+        """
+        version = get_profiles_version()
+        cached = self._notification_schedule
+        if cached and cached[1] == version and (time.monotonic() - cached[0]) < self.ACTIVE_USERS_TTL:
+            return cached[2]
+
+        schedule = self._build_notification_schedule()
+        self._notification_schedule = (time.monotonic(), version, schedule)
+        return schedule
+
+    def invalidate_notification_schedule(self):
+        """同进程内用户修改作息/通知设置后调用，下一次 tick 重建触发表"""
+        self._notification_schedule = None
+
+    def _build_notification_schedule(self) -> Dict[int, List[Tuple[str, str]]]:
+        """根据活跃用户的作息设置构建触发表
+
+        统一推送路径：只通过 proactive_check_agent 进行 AI 自主决策，
+        在起床 / 12:00 / 18:00 / 睡前 15 分钟 四个时间点触发。
+        """
+        from app.services.profile_service import profile_service
+
+        user_ids = self._get_all_active_users()
+        if not user_ids:
+            return {}
+
+        # user_profiles 以 Apple ID 为 key，找不到时回退到 UUID
+        apple_ids = get_apple_ids(user_ids)
+        profile_keys = {uid: apple_ids.get(uid) or uid for uid in user_ids}
+        profiles = profile_service.get_profiles_bulk(list(profile_keys.values()))
+
+        schedule: Dict[int, List[Tuple[str, str]]] = {}
+        for user_id in user_ids:
+            profile = profiles.get(profile_keys[user_id])
+            settings = profile.preferences if profile else {}
+
+            wake_minute = self._minute_of_day(settings.get("wake_time", "08:00"))
+            sleep_minute = self._minute_of_day(settings.get("sleep_time", "22:00"))
+
+            # 睡前 15 分钟（跨天时回绕到前一天晚上）
+            ritual_minute = (sleep_minute - 15) % (24 * 60) if sleep_minute is not None else None
+
+            # 时间点重合时后者覆盖前者（与逐分钟比较时的行为一致）；无法解析的时间点跳过
+            check_mapping = {
+                wake_minute: "morning",
+                12 * 60: "noon",
+                18 * 60: "evening",
+                ritual_minute: "night"
+            }
+            for minute, check_type in check_mapping.items():
+                if minute is not None:
+                    schedule.setdefault(minute, []).append((user_id, check_type))
+
+        return schedule
+
+    def _schedule_background(self, coro) -> asyncio.Task:
+        """把耗时的 LLM 调用放到后台执行，不阻塞当前 tick"""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+
+    async def _run_proactive_check(self, user_id: str, check_type: str):
+        """后台执行 proactive check（信号量限制并发的 LLM 调用数）"""
+        async with self._user_check_semaphore:
+            try:
+                logger.info("Heartbeat [%s] for user %.8s...", check_type, user_id)
+                await proactive_check_agent.run_check(
+                    user_id=user_id,
+                    check_type=check_type
+                )
+            except Exception as pe:
+                logger.error("Proactive check error for %s: %s", user_id, pe)
     
-    async def _process_pending_notifications(self):
+    async def _process_pending_notifications(self, tick_time: Optional[datetime] = None):
         """处理待发送的通知（含分布式锁防重）"""
         try:
             # 使用与 _check_event_reminders 相同的锁机制，防止多 Worker 重复处理
-            user_tz = pytz.timezone("Asia/Shanghai")
-            current_minute = datetime.now(user_tz).strftime('%Y%m%d%H%M')
+            current_minute = (tick_time or datetime.now(SHANGHAI_TZ)).strftime('%Y%m%d%H%M')
             lock_key = f"process_pending_notifications:{current_minute}"
             
-            if not self._acquire_scheduler_lock(lock_key):
+            if not await self._run_io(self._acquire_scheduler_lock, lock_key):
                 return  # 其他 Worker 已抢占，跳过本轮
             
             from app.services.notification_service import notification_service
             await notification_service.process_pending_notifications()
         except Exception as e:
-            print(f"[Scheduler] Error processing pending notifications: {e}")
+            logger.error("Error processing pending notifications: %s", e)
 
     def _acquire_scheduler_lock(self, lock_key: str) -> bool:
         """基于 SQLite 主键唯一约束的分布式/多进程互斥防重锁"""
-        from sqlalchemy import create_engine, text
-        from sqlalchemy.exc import IntegrityError
-        from app.config import settings
-        
-        db_path = settings.database_url.replace("sqlite:///", "")
-        engine = create_engine(f"sqlite:///{db_path}")
-        
+        return acquire_scheduler_lock(lock_key)
+
+    async def _check_event_reminders(self, tick_time: Optional[datetime] = None):
+        """
+        检查即将开始的事件并发送提醒通知
+
+        同步的 SQLite 查询与去重登记在 DB 线程池中执行（_collect_event_reminders），
+        不阻塞事件循环；事件循环上只负责生成并发送提醒。
+
+        Args:
+            tick_time: 本轮 tick 的北京时间（aware），缺省时取当前时间
+        """
+        # naive 北京时间，与数据库格式一致
+        current_time = (tick_time or datetime.now(SHANGHAI_TZ)).replace(tzinfo=None)
+
         try:
-            with engine.connect() as conn:
-                # 确保锁表存在 (仅在第一次有效)
-                conn.execute(text("""
-                    CREATE TABLE IF NOT EXISTS scheduler_locks (
-                        lock_key VARCHAR(255) PRIMARY KEY,
-                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                    )
-                """))
-                conn.commit()
-                
-                # 抢占锁
-                conn.execute(
-                    text("INSERT INTO scheduler_locks (lock_key) VALUES (:key)"),
-                    {"key": lock_key}
-                )
-                conn.commit()
-                return True
-        except IntegrityError:
-            # SQLite 同一毫秒内主键冲突
-            return False
+            events_to_remind = await self._run_io(self._collect_event_reminders, current_time)
+            if not events_to_remind:
+                return
+
+            logger.info("Found %d events needing reminders", len(events_to_remind))
+
+            due_now = []
+            for event in events_to_remind:
+                if event.delay_seconds:
+                    # 还没到点：后台等待到准点再发送，不阻塞本轮 tick
+                    self._schedule_background(self._send_event_reminder(event))
+                else:
+                    due_now.append(event)
+
+            # 已到点的提醒互不依赖，并发生成/发送（_send_event_reminder 自行捕获并记录异常）
+            if due_now:
+                await asyncio.gather(*(self._send_event_reminder(event) for event in due_now))
+
         except Exception as e:
-            error_str = str(e).lower()
-            if "unique constraint failed" in error_str or "database is locked" in error_str:
-                return False
-            print(f"[Scheduler Lock] Error for {lock_key}: {e}")
-            return False
-        finally:
-            engine.dispose()
-
-    async def _check_event_reminders(self):
+            logger.error("Error checking event reminders: %s", e)
+
+    def _collect_event_reminders(self, current_time: datetime) -> List[EventReminder]:
         """
-        检查即将开始的事件并发送提醒通知
+        找出本轮需要发送的事件提醒，并在 sent_reminders 中登记（同步，供线程池调用）
         
         时区处理说明:
         - 数据库中 start_time 存储的是本地时间 (Asia/Shanghai) 的 naive datetime
-        - datetime.now() 也是本地 naive datetime
+        - current_time 也是本地 naive datetime
         - 因此可以直接比较,无需时区转换
         
         逻辑:
-        1. 查询当天/明天有 start_time 的真实事件
+        1. 查询 start_time 落在本轮提醒窗口内的真实事件
         2. 查询模板事件,虚拟展开为当天/明天的实例
         3. 在 Python 中精确计算时间差
         4. 检查用户是否开启了事件提醒
         5. 避免重复发送
-        6. 发送 event_reminder 通知
+
+        Returns:
+            待发送的提醒列表
         """
-        user_tz = pytz.timezone("Asia/Shanghai")
-        current_time = datetime.now(user_tz).replace(tzinfo=None)  # naive 北京时间，与数据库格式一致
-        today_str = current_time.strftime("%Y-%m-%d")
-        tomorrow_str = (current_time + timedelta(days=1)).strftime("%Y-%m-%d")
+        # 今天 00:00 到后天 00:00 的半开区间（用于按 event_date 查找重复事件的真实实例）；
+        # DB 中时间存为 "YYYY-MM-DD HH:MM:SS[.ffffff]"，字符串按字典序比较即等价于时间比较，且可以走索引
+        window_start = current_time.strftime("%Y-%m-%d") + " 00:00:00"
+        window_end = (current_time + timedelta(days=2)).strftime("%Y-%m-%d") + " 00:00:00"
+
+        # 本轮可能触发提醒的 start_time 范围：(现在, 现在 + 最大提前量 + 余量)，
+        # 只把这一小段时间内的事件取出来做精确判断，而不是今明两天的全部事件
+        remind_from = current_time.strftime("%Y-%m-%d %H:%M:%S")
+        remind_until = (
+            current_time + timedelta(minutes=self.MAX_EVENT_REMINDER_MINUTES + 2)
+        ).strftime("%Y-%m-%d %H:%M:%S")
         
-        try:
-            from sqlalchemy import create_engine, text
-            from app.config import settings
-            from app.services.notification_service import notification_service
-            from app.services.profile_service import profile_service
-            from app.services.virtual_expansion import virtual_expansion_service
-            from app.models.notification import NotificationType, NotificationPriority, NotificationPayload
+        from app.services.virtual_expansion import virtual_expansion_service
+
+        # 每分钟执行的只读查询直接交给 sqlite3 驱动执行（exec_driver_sql），
+        # 跳过 text() 的 SQL 编译和绑定参数处理；sqlite3 原生支持 :name 命名参数
+        with get_engine().connect() as conn:
+            # 1. 查询 start_time 落在提醒窗口内的未完成真实事件
+            result = conn.exec_driver_sql(
+                _REMINDER_EVENTS_SQL,
+                {"remind_from": remind_from, "remind_until": remind_until}
+            ).fetchall()
             
-            db_path = settings.database_url.replace("sqlite:///", "")
-            engine = create_engine(f"sqlite:///{db_path}")
+            # 2. 查询模板事件并虚拟展开,让重复事件也能收到提醒
+            template_rows = conn.exec_driver_sql(_REMINDER_TEMPLATES_SQL).fetchall()
             
-            with engine.connect() as conn:
-                # 1. 查询今天或明天有 start_time 的未完成真实事件
-                result = conn.execute(
-                    text("""
-                        SELECT e.id, e.user_id, e.title, e.start_time, e.event_date, u.user_id as profile_user_id
-                        FROM events e
-                        LEFT JOIN users u ON e.user_id = u.id
-                        WHERE (e.start_time LIKE :today_pattern OR e.start_time LIKE :tomorrow_pattern)
-                        AND e.status IN ('pending', 'in_progress', 'PENDING', 'IN_PROGRESS')
-                        AND e.is_template = 0
-                    """),
-                    {
-                        "today_pattern": f"{today_str}%",
-                        "tomorrow_pattern": f"{tomorrow_str}%"
-                    }
-                ).fetchall()
+            # 将模板虚拟展开为今天/明天的实例
+            virtual_rows = []
+            if template_rows:
+                import json
                 
-                # 2. 查询模板事件并虚拟展开,让重复事件也能收到提醒
-                template_rows = conn.execute(
-                    text("""
-                        SELECT e.id, e.user_id, e.title, e.start_time, e.event_date,
-                               e.repeat_pattern, e.duration, e.time_period, e.event_type,
-                               e.category, e.created_at, e.project_id,
-                               u.user_id as profile_user_id
-                        FROM events e
-                        LEFT JOIN users u ON e.user_id = u.id
-                        WHERE e.is_template = 1
-                        AND e.status NOT IN ('cancelled', 'CANCELLED')
-                    """)
-                ).fetchall()
+                # 模板很少变化：按 (模板 ID, 原文) 复用上一轮的解析结果，
+                # 每轮只保留本轮仍存在的模板，已删除/已修改的条目自然淘汰
+                previous_patterns = self._repeat_pattern_cache
+                parsed_patterns: Dict[Tuple[str, str], dict] = {}
+                templates_for_expansion = []
+                for trow in template_rows:
+                    pattern_raw = trow[5]  # repeat_pattern
+                    if not pattern_raw:
+                        continue
+                    if isinstance(pattern_raw, str):
+                        key = (trow[0], pattern_raw)
+                        pattern = previous_patterns.get(key)
+                        if pattern is None:
+                            try:
+                                pattern = json.loads(pattern_raw)
+                            except json.JSONDecodeError:
+                                continue
+                        parsed_patterns[key] = pattern
+                    else:
+                        pattern = pattern_raw
+
+                    templates_for_expansion.append({
+                        "id": trow[0],
+                        "user_id": trow[1],
+                        "title": trow[2],
+                        "start_time": trow[3],
+                        "event_date": trow[4],
+                        "repeat_pattern": pattern,
+                        "duration": trow[6],
+                        "time_period": trow[7],
+                        "event_type": trow[8],
+                        "category": trow[9],
+                        "created_at": trow[10],
+                        "project_id": trow[11],
+                        "profile_user_id": trow[12],
+                    })
                 
-                # 将模板虚拟展开为今天/明天的实例
-                virtual_rows = []
-                if template_rows:
-                    import json
-                    from pytz import timezone as pytz_timezone
-                    tz = pytz_timezone("Asia/Shanghai")
+                self._repeat_pattern_cache = parsed_patterns
+
+                if templates_for_expansion:
+                    # 查询已存在的真实实例(避免虚拟展开已有实例的日期)
+                    real_instances_raw = conn.exec_driver_sql(
+                        _ROUTINE_INSTANCES_SQL,
+                        {"window_start": window_start, "window_end": window_end}
+                    ).fetchall()
                     
-                    templates_for_expansion = []
-                    for trow in template_rows:
-                        pattern_raw = trow[5]  # repeat_pattern
-                        if not pattern_raw:
-                            continue
-                        try:
-                            pattern = json.loads(pattern_raw) if isinstance(pattern_raw, str) else pattern_raw
-                        except (json.JSONDecodeError, TypeError):
-                            continue
-                        
-                        templates_for_expansion.append({
-                            "id": trow[0],
-                            "user_id": trow[1],
-                            "title": trow[2],
-                            "start_time": trow[3],
-                            "event_date": trow[4],
-                            "repeat_pattern": pattern,
-                            "duration": trow[6],
-                            "time_period": trow[7],
-                            "event_type": trow[8],
-                            "category": trow[9],
-                            "created_at": trow[10],
-                            "project_id": trow[11],
-                            "profile_user_id": trow[12],
-                        })
+                    real_instances_for_lookup = [
+                        {"id": r[0], "user_id": r[1], "parent_event_id": r[2], "event_date": r[3]}
+                        for r in real_instances_raw
+                    ]
                     
-                    if templates_for_expansion:
-                        # 查询已存在的真实实例(避免虚拟展开已有实例的日期)
-                        real_instances_raw = conn.execute(
-                            text("""
-                                SELECT id, user_id, parent_routine_id as parent_event_id, event_date
-                                FROM events
-                                WHERE is_template = 0
-                                AND parent_routine_id IS NOT NULL
-                                AND (event_date LIKE :today_pattern OR event_date LIKE :tomorrow_pattern)
-                            """),
-                            {
-                                "today_pattern": f"{today_str}%",
-                                "tomorrow_pattern": f"{tomorrow_str}%"
-                            }
-                        ).fetchall()
-                        
-                        real_instances_for_lookup = [
-                            {"id": r[0], "user_id": r[1], "parent_event_id": r[2], "event_date": r[3]}
-                            for r in real_instances_raw
-                        ]
-                        
-                        today_dt = tz.localize(datetime.strptime(today_str, "%Y-%m-%d"))
-                        tomorrow_end = tz.localize(datetime.strptime(tomorrow_str, "%Y-%m-%d").replace(hour=23, minute=59, second=59))
+                    today_dt = SHANGHAI_TZ.localize(datetime.combine(current_time.date(), datetime.min.time()))
+                    tomorrow_end = SHANGHAI_TZ.localize(datetime.combine(current_time.date() + timedelta(days=1), datetime.min.time()).replace(hour=23, minute=59, second=59))
+
+                    virtual_instances = virtual_expansion_service.expand_templates(
+                        templates=templates_for_expansion,
+                        real_instances=real_instances_for_lookup,
+                        start_date=today_dt,
+                        end_date=tomorrow_end
+                    )
+
+                    # 模板 ID → (profile_user_id, 提醒分钟数)，避免对每个虚拟实例线性扫描模板列表
+                    reminder_meta_by_template = {
+                        trow[0]: (trow[12], trow[13]) for trow in template_rows
+                    }
+
+                    # 将有 start_time 的虚拟实例转换为与真实事件相同的格式
+                    for vi in virtual_instances:
+                        vi_start = vi.get("start_time")
+                        if not vi_start:
+                            continue  # 没有具体时间的虚拟实例跳过
                         
-                        virtual_instances = virtual_expansion_service.expand_templates(
-                            templates=templates_for_expansion,
-                            real_instances=real_instances_for_lookup,
-                            start_date=today_dt,
-                            end_date=tomorrow_end
+                        # 找到对应模板的 profile_user_id 和提醒设置
+                        p_user_id, t_minutes = reminder_meta_by_template.get(
+                            vi.get("template_id"), (None, None)
                         )
                         
-                        # 将有 start_time 的虚拟实例转换为与真实事件相同的格式
-                        for vi in virtual_instances:
-                            vi_start = vi.get("start_time")
-                            if not vi_start:
-                                continue  # 没有具体时间的虚拟实例跳过
-                            
-                            # 找到对应模板的 profile_user_id
-                            template_id = vi.get("template_id")
-                            p_user_id = None
-                            for t in templates_for_expansion:
-                                if t["id"] == template_id:
-                                    p_user_id = t.get("profile_user_id")
-                                    break
-                            
-                            # 转换 start_time 为 naive local datetime 字符串
-                            if isinstance(vi_start, datetime):
-                                st_str = vi_start.strftime("%Y-%m-%d %H:%M:%S") if vi_start.tzinfo is None else vi_start.astimezone(tz).strftime("%Y-%m-%d %H:%M:%S")
-                            else:
-                                st_str = str(vi_start)
-                            
-                            virtual_rows.append((
-                                vi.get("id"),       # event_id (virtual_xxx)
-                                vi.get("user_id"),   # user_id
-                                vi.get("title"),     # title
-                                st_str,              # start_time string
-                                vi.get("event_date"),# event_date
-                                p_user_id            # profile_user_id
-                            ))
+                        # 转换 start_time 为 naive local datetime 字符串
+                        if isinstance(vi_start, datetime):
+                            st_str = vi_start.strftime("%Y-%m-%d %H:%M:%S") if vi_start.tzinfo is None else vi_start.astimezone(SHANGHAI_TZ).strftime("%Y-%m-%d %H:%M:%S")
+                        else:
+                            st_str = str(vi_start)
+
+                        # 与真实事件相同的时间窗口，窗口外的实例本轮不可能触发
+                        if not (remind_from < st_str < remind_until):
+                            continue
                         
-                        if virtual_rows:
-                            print(f"[Scheduler] Found {len(virtual_rows)} virtual recurring instances for reminder check")
-                
-                # 合并真实事件和虚拟实例
-                all_rows = list(result) + virtual_rows
-                
-                if not all_rows:
-                    return
-                
-                events_to_remind = []
-                
-                for row in all_rows:
-                    event_id, user_uuid, title, start_time_raw, event_date, profile_user_id = row
+                        virtual_rows.append((
+                            vi.get("id"),       # event_id (virtual_xxx)
+                            vi.get("user_id"),   # user_id
+                            vi.get("title"),     # title
+                            st_str,              # start_time string
+                            vi.get("event_date"),# event_date
+                            p_user_id,           # profile_user_id
+                            t_minutes            # reminder_minutes
+                        ))
                     
-                    # 使用 profile_user_id (例如 "001762...") 查找配置,因为这是前端更新配置时使用的 ID
-                    # 如果没有,则回退到 user_uuid
-                    target_user_id = profile_user_id if profile_user_id else user_uuid
+                    if virtual_rows:
+                        logger.debug("Found %d virtual recurring instances for reminder check", len(virtual_rows))
+
+            # 合并真实事件和虚拟实例
+            all_rows = list(result) + virtual_rows
+
+            if not all_rows:
+                return []
+
+            events_to_remind = []
+
+            # 一次性读取今天起已发送的提醒，循环内做集合判断
+            sent_reminders = get_sent_reminders(current_time.strftime("%Y%m%d") + "0000")
+
+            for row in all_rows:
+                # 用户提醒设置已在主查询中 JOIN user_profiles 取出（按 profile_user_id，
+                # 即前端更新配置时使用的 ID，没有则回退到 user_uuid）；关闭了事件提醒的用户
+                # 在 SQL 中已被过滤，没有画像时用默认值
+                event_id, user_uuid, title, start_time_raw, event_date, profile_user_id, pref_minutes = row
+
+                try:
+                    # 解析事件开始时间
+                    event_start = self._parse_start_time(start_time_raw)
+                    if not event_start:
+                        continue
                     
-                    try:
-                        # 解析事件开始时间
-                        event_start = self._parse_start_time(start_time_raw)
-                        if not event_start:
-                            continue
+                    reminder_minutes = pref_minutes if pref_minutes is not None else 15
+
+                    # 计算距离事件开始的分钟数
+                    time_diff = (event_start - current_time).total_seconds() / 60
+
+                    # 检查是否应该发送提醒:
+                    # - 在 (reminder_minutes - 1, reminder_minutes + 1] 范围内触发一次
+                    # - 已进入 (reminder_minutes - 1, reminder_minutes] 的立即发送
+                    # - 还差不到 1 分钟才到点的，提前一轮领取并在后台 sleep 到准点再发，
+                    #   而不是等下一次 tick（最多晚 60 秒）
+                    # - sent_reminders 去重确保每个事件只触发一次
+                    if time_diff > 0 and (reminder_minutes - 1) < time_diff <= reminder_minutes + 1:
                         
-                        # 获取用户提醒设置
-                        profile = profile_service.get_or_create_profile(target_user_id)
-                        prefs = profile.preferences
-                        
-                        reminder_minutes = prefs.get("event_reminder_minutes", 15)
-                        
-                        # 计算距离事件开始的分钟数
-                        time_diff = (event_start - current_time).total_seconds() / 60
-                        
-                        if not prefs.get("event_reminders_enabled", True):
+                        # 使用 用户 + 事件 ID + 预定发生时间 唯一标识这一次提醒
+                        event_time_str = event_start.strftime('%Y%m%d%H%M')
+                        if (user_uuid, event_id, event_time_str) in sent_reminders:
                             continue
+
+                        delay_seconds = max(0.0, (time_diff - reminder_minutes) * 60)
+
+                        # sent_reminders 主键唯一约束兼作原子锁，防止多 Worker 竞态。
+                        # 需要等待的提醒到点后再登记（见 _send_event_reminder），
+                        # 否则等待期间进程停止/重启会让这条提醒被永久标记为已发送而丢失
+                        if not delay_seconds and not mark_reminder_sent(user_uuid, event_id, event_time_str):
+                            # 被别的 worker 抢先了，放弃
+                            continue
+
+                        events_to_remind.append(EventReminder(
+                            event_id=event_id,
+                            user_id=user_uuid,
+                            title=title,
+                            reminder_minutes=reminder_minutes,
+                            minutes_until=reminder_minutes if delay_seconds else round(time_diff),
+                            delay_seconds=delay_seconds,
+                            event_time=event_time_str
+                        ))
                         
-                        # 检查是否应该发送提醒:
-                        # - 只在 (reminder_minutes - 1, reminder_minutes] 范围内触发一次
-                        # - 例如:设置15分钟提醒,只在 14-15 分钟时触发(调度器每分钟检查一次)
-                        # - 这确保每个事件只在一个时间窗口内触发一次
-                        if time_diff > 0 and (reminder_minutes - 1) < time_diff <= reminder_minutes:
-                            
-                            # 【修改为使用基于表主键的原子锁，防止多 Worker 竞态】
-                            # 使用事件 ID + 预定发生时间的唯一组合来锁住这一次提醒
-                            event_time_str = event_start.strftime('%Y%m%d%H%M')
-                            lock_key = f"event_reminder:{event_id}:{event_time_str}"
-                            
-                            if not self._acquire_scheduler_lock(lock_key):
-                                # 被别的 worker 抢先了，放弃
-                                continue
-                                
-                            events_to_remind.append({
-                                "event_id": event_id,
-                                "user_id": user_uuid,
-                                "title": title,
-                                "reminder_minutes": reminder_minutes,
-                                "minutes_until": round(time_diff)
-                            })
-                            
-                    except Exception as e:
-                        print(f"[Scheduler] Error parsing event {event_id}: {e}")
-                
-                if not events_to_remind:
+                except Exception as e:
+                    logger.warning("Error parsing event %s: %s", event_id, e)
+
+            return events_to_remind
+
+    async def _send_event_reminder(self, event: EventReminder):
+        """生成并发送单条事件提醒（delay_seconds > 0 时先等待到准点）"""
+        from app.agents.notification_agent import notification_agent
+
+        try:
+            if event.delay_seconds:
+                await asyncio.sleep(event.delay_seconds)
+                # 到点后才登记；被别的 worker 或下一轮 tick 抢先时放弃
+                if not await self._run_io(mark_reminder_sent, event.user_id, event.event_id, event.event_time):
                     return
-                    
-                print(f"[Scheduler] Found {len(events_to_remind)} events needing reminders")
-                
-                from app.agents.notification_agent import notification_agent
-                
-                for event in events_to_remind:
-                    try:
-                        print(f"[Scheduler] Generating event reminder: '{event['title']}' in {event['minutes_until']} min (user: {event['user_id'][:8]}...)")
-                        
-                        # 使用 NotificationAgent 生成个性化提醒（+ 注入对话）
-                        await notification_agent.generate_event_reminder(
-                            user_id=event["user_id"],
-                            event_title=event["title"],
-                            event_start_time="",  # 由 minutes_until 推导
-                            minutes_until=event["minutes_until"],
-                            event_id=event["event_id"]
-                        )
-                        
-                    except Exception as e:
-                        print(f"[Scheduler] Error sending reminder for event {event['event_id']}: {e}")
-                        
+
+            # 到点后才占用并发名额，等待中的提醒不挤占正在发送的
+            async with self._event_reminder_semaphore:
+                logger.info("Generating event reminder: %r in %d min (user: %.8s...)",
+                            event.title, event.minutes_until, event.user_id)
+
+                # 使用 NotificationAgent 生成个性化提醒（+ 注入对话）
+                await notification_agent.generate_event_reminder(
+                    user_id=event.user_id,
+                    event_title=event.title,
+                    event_start_time="",  # 由 minutes_until 推导
+                    minutes_until=event.minutes_until,
+                    event_id=event.event_id
+                )
+
         except Exception as e:
-            print(f"[Scheduler] Error checking event reminders: {e}")
+            logger.error("Error sending reminder for event %s: %s", event.event_id, e)
     
     def _parse_start_time(self, start_time_raw) -> datetime:
         """
@@ -480,144 +802,111 @@ class BackgroundTaskScheduler:
             return start_time_raw.replace(tzinfo=None) if start_time_raw.tzinfo else start_time_raw
         
         if isinstance(start_time_raw, str):
-            try:
-                # 尝试各种格式
-                time_str = start_time_raw.strip()
-                
-                # 处理带时区后缀的情况
-                if time_str.endswith('Z'):
-                    time_str = time_str[:-1] + '+00:00'
-                
-                # 尝试 fromisoformat(支持多种 ISO 格式)
+            time_str = start_time_raw.strip()
+
+            # 一次正则匹配识别所有已知格式，不走异常驱动的格式尝试
+            m = _START_TIME_RE.fullmatch(time_str)
+            if not m:
+                # 未知格式才交给 fromisoformat 兜底
                 try:
                     parsed = datetime.fromisoformat(time_str)
-                    if parsed.tzinfo:
-                        # 有时区信息,转换为本地时间
-                        import pytz
-                        local_tz = pytz.timezone("Asia/Shanghai")
-                        parsed = parsed.astimezone(local_tz).replace(tzinfo=None)
-                    return parsed
                 except ValueError:
-                    pass
-                
-                # 尝试 SQLite 存储格式
-                for fmt in ["%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M"]:
-                    try:
-                        return datetime.strptime(time_str, fmt)
-                    except ValueError:
-                        continue
-                        
-            except Exception as e:
-                print(f"[Scheduler] Failed to parse start_time '{start_time_raw}': {e}")
-                
+                    logger.warning("Failed to parse start_time %r", start_time_raw)
+                    return None
+                if parsed.tzinfo:
+                    parsed = parsed.astimezone(SHANGHAI_TZ).replace(tzinfo=None)
+                return parsed
+
+            year, month, day, hour, minute, second, fraction, tz = m.groups()
+            try:
+                parsed = datetime(
+                    int(year), int(month), int(day), int(hour), int(minute),
+                    int(second) if second else 0,
+                    int(fraction.ljust(6, "0")) if fraction else 0
+                )
+            except ValueError:
+                return None  # 非法日期（如 02-30）
+
+            if tz:
+                # 有时区信息,先换算成 UTC 再转换为本地时间
+                if tz != "Z":
+                    sign = -1 if tz[0] == "-" else 1
+                    offset = int(tz[1:3]) * 60 + int(tz[-2:])
+                    parsed -= timedelta(minutes=sign * offset)
+                parsed = pytz.UTC.localize(parsed).astimezone(SHANGHAI_TZ).replace(tzinfo=None)
+            return parsed
+
         return None
 
-    async def _check_user_notifications(self, user_id: str, current_hm: str, current_time_dt: datetime = None):
+    async def _check_user_notifications(self, user_id: str, check_type: str, today_str: str):
         """
-        检查单个用户的通知时间点
-        
-        统一推送路径：只通过 proactive_check_agent 进行 AI 自主决策。
-        早中晚报不再单独推送（已合并到 proactive_check 的 prompt 中）。
-        
+        触发单个用户本分钟到点的 Heartbeat
+
         Args:
             user_id: 用户 UUID (users.id)
-            current_hm: 当前时间 HH:MM 格式
-            current_time_dt: 当前北京时间 datetime 对象
+            check_type: morning / noon / evening / night
+            today_str: 北京时间日期 YYYYmmdd，用于锁的唯一标识
         """
         try:
-            from app.services.profile_service import profile_service
-            apple_id = self._get_apple_id(user_id)
-            profile_key = apple_id if apple_id else user_id
-            profile = profile_service.get_or_create_profile(profile_key)
-            settings = profile.preferences
-            
-            wake_time = settings.get("wake_time", "08:00")
-            sleep_time = settings.get("sleep_time", "22:00")
-            
-            # 睡前时间
-            ritual_time = self._subtract_minutes(sleep_time, 15)
-            
-            # === 统一 AI 自主检查 (Heartbeat) ===
-            # 在四个时间点触发 AI 自主思考（合并了原来的早中晚报 + 自主检查）
-            check_mapping = {
-                wake_time: "morning",
-                "12:00": "noon",
-                "18:00": "evening",
-                ritual_time: "night"
-            }
-            check_type = check_mapping.get(current_hm)
-            if check_type:
-                # 获取锁，防止多 Worker 重复推送
-                today_str = datetime.now(pytz.timezone("Asia/Shanghai")).strftime("%Y%m%d")
-                lock_key = f"proactive_check:{user_id}:{check_type}:{today_str}"
-
-                if not self._acquire_scheduler_lock(lock_key):
-                    print(f"[Scheduler] Locked: {check_type} already grabbed for {user_id[:8]}... today")
-                    return
+            # 获取锁，防止多 Worker 重复推送
+            lock_key = f"proactive_check:{user_id}:{check_type}:{today_str}"
 
-                try:
-                    print(f"[Scheduler] Heartbeat [{check_type}] for user {user_id[:8]}...")
-                    await proactive_check_agent.run_check(
-                        user_id=user_id,
-                        check_type=check_type
-                    )
-                except Exception as pe:
-                    print(f"[Scheduler] Proactive check error for {user_id}: {pe}")
+            if not await self._run_io(self._acquire_scheduler_lock, lock_key):
+                logger.debug("Locked: %s already grabbed for %.8s... today", check_type, user_id)
+                return
+
+            # 锁已抢到，LLM 调用转入后台，不占用本分钟的 tick
+            self._schedule_background(self._run_proactive_check(user_id, check_type))
                 
         except Exception as e:
-            print(f"[Scheduler] Error checking notifications for {user_id}: {e}")
+            logger.error("Error checking notifications for %s: %s", user_id, e)
     
-    def _subtract_minutes(self, time_str: str, minutes: int) -> str:
-        """从时间字符串减去指定分钟数"""
+    @staticmethod
+    def _minute_of_day(time_str: str) -> Optional[int]:
+        """把 "HH:MM" 转为一天中的第几分钟，无法解析时返回 None"""
         try:
-            parts = time_str.split(":")
-            hour = int(parts[0])
-            minute = int(parts[1])
-            
-            total_minutes = hour * 60 + minute - minutes
-            if total_minutes < 0:
-                total_minutes += 24 * 60  # 处理跨天
-            
-            new_hour = total_minutes // 60
-            new_minute = total_minutes % 60
-            
-            return f"{new_hour:02d}:{new_minute:02d}"
-        except Exception:
-            return time_str
+            hour, minute = time_str.split(":")[:2]
+            hour, minute = int(hour), int(minute)
+        except (AttributeError, ValueError):
+            return None
+        if not (0 <= hour < 24 and 0 <= minute < 60):
+            return None
+        return hour * 60 + minute
     
     def _get_all_active_users(self) -> List[str]:
-        """获取所有活跃用户的 UUID (7天内有活动)
+        """获取所有活跃用户的 UUID (7天内有活动)，结果缓存 ACTIVE_USERS_TTL 秒
         
         Returns:
             用户 UUID 列表 (users.id)，与 devices.user_id 一致
         """
-        from sqlalchemy import create_engine, text
-        from app.config import settings
-        
+        cached = self._active_users_cache
+        if cached and (time.monotonic() - cached[0]) < self.ACTIVE_USERS_TTL:
+            return list(cached[1])
+
+        user_ids = self._query_all_active_users()
+        # 查询失败时返回空列表，不缓存，下一分钟重试
+        if user_ids:
+            self._active_users_cache = (time.monotonic(), user_ids)
+        return list(user_ids)
+
+    def _query_all_active_users(self) -> List[str]:
+        """查询近 7 天活跃用户（不走缓存）"""
         try:
-            db_path = settings.database_url.replace("sqlite:///", "")
-            engine = create_engine(f"sqlite:///{db_path}")
-            
-            with engine.connect() as conn:
+            with get_engine().connect() as conn:
                 # 获取7天内有活动的用户
                 # 注意: DB 中时间戳是 UTC 格式 "YYYY-MM-DD HH:MM:SS"
-                user_tz = pytz.timezone("Asia/Shanghai")
-                now_local = datetime.now(user_tz).replace(tzinfo=None)
+                now_local = datetime.now(SHANGHAI_TZ).replace(tzinfo=None)
                 seven_days_ago_local = now_local - timedelta(days=7)
-                seven_days_ago_utc = user_tz.localize(seven_days_ago_local).astimezone(pytz.UTC)
+                seven_days_ago_utc = SHANGHAI_TZ.localize(seven_days_ago_local).astimezone(pytz.UTC)
                 seven_days_ago_str = seven_days_ago_utc.strftime("%Y-%m-%d %H:%M:%S")
                 
                 # 返回 id (UUID) 而非 user_id (Apple ID)
                 # 因为 devices.user_id 关联的是 users.id (UUID)
-                result = conn.execute(
-                    text("""SELECT DISTINCT id FROM users
-                           WHERE last_active_at >= :since OR created_at >= :since"""),
-                    {"since": seven_days_ago_str}
-                ).fetchall()
+                result = conn.execute(_ACTIVE_USERS_SQL, {"since": seven_days_ago_str})
                 
                 return [row[0] for row in result if row[0]]
         except Exception as e:
-            print(f"[Scheduler] Error getting active users: {e}")
+            logger.error("Error getting active users: %s", e)
             return []
     
     def _get_apple_id(self, uuid_id: str) -> Optional[str]:
@@ -629,69 +918,51 @@ class BackgroundTaskScheduler:
         Returns:
             Apple ID 字符串，如果找不到则返回 None
         """
-        from sqlalchemy import create_engine, text
-        from app.config import settings
-        
         try:
-            db_path = settings.database_url.replace("sqlite:///", "")
-            engine = create_engine(f"sqlite:///{db_path}")
-            
-            with engine.connect() as conn:
-                result = conn.execute(
-                    text("SELECT user_id FROM users WHERE id = :id"),
-                    {"id": uuid_id}
-                ).fetchone()
-                return result[0] if result else None
+            return get_apple_id(uuid_id)
         except Exception as e:
-            print(f"[Scheduler] Error getting apple_id for {uuid_id}: {e}")
+            logger.error("Error getting apple_id for %s: %s", uuid_id, e)
             return None
 
-
     def _get_active_users_for_date(self, target_date: date) -> List[str]:
-        """获取指定日期有对话的用户列表"""
-        from sqlalchemy import create_engine, text
-        from app.config import settings
-
-        db_path = settings.database_url.replace("sqlite:///", "")
-        engine = create_engine(f"sqlite:///{db_path}")
-
-        with engine.connect() as conn:
-            # 注意: DB 中时间戳是 UTC 格式 "YYYY-MM-DD HH:MM:SS"
-            # 需要将本地日期转换为 UTC 范围
-            user_tz = pytz.timezone("Asia/Shanghai")
-            start_local = datetime.combine(target_date, datetime.min.time())
-            end_local = datetime.combine(target_date, datetime.max.time())
-            start_utc = user_tz.localize(start_local).astimezone(pytz.UTC).strftime("%Y-%m-%d %H:%M:%S")
-            end_utc = user_tz.localize(end_local).astimezone(pytz.UTC).strftime("%Y-%m-%d %H:%M:%S")
+        """获取指定日期有对话的用户列表（按日期缓存，TTL 见 ACTIVE_USERS_FOR_DATE_TTL）"""
+        cached = self._active_users_for_date_cache.get(target_date)
+        if cached and (time.monotonic() - cached[0]) < self.ACTIVE_USERS_FOR_DATE_TTL:
+            return list(cached[1])
+
+        user_ids = self._query_active_users_for_date(target_date)
+
+        # 只保留少量日期，避免长期运行时缓存无限增长
+        if len(self._active_users_for_date_cache) >= self.ACTIVE_USERS_FOR_DATE_CACHE_SIZE:
+            self._active_users_for_date_cache.clear()
+        self._active_users_for_date_cache[target_date] = (time.monotonic(), user_ids)
+        return list(user_ids)
+
+    def _query_active_users_for_date(self, target_date: date) -> List[str]:
+        """查询指定日期有对话的用户列表（不走缓存）"""
+        with get_engine().connect() as conn:
+            # 本地日期转换为 UTC 半开区间
+            start_utc, end_utc = _day_bounds(target_date)
 
             result = conn.execute(
-                text("""SELECT DISTINCT user_id FROM conversations
-                       WHERE created_at >= :start AND created_at <= :end"""),
+                text("""SELECT user_id FROM conversations
+                       WHERE created_at >= :start AND created_at < :end
+                       GROUP BY user_id"""),
                 {"start": start_utc, "end": end_utc}
-            ).fetchall()
+            )
 
             return [row[0] for row in result]
 
     def _get_user_conversations(self, user_id: str, target_date: date) -> List[str]:
         """获取用户在指定日期的对话ID列表"""
-        from sqlalchemy import create_engine, text
-        from app.config import settings
-
-        db_path = settings.database_url.replace("sqlite:///", "")
-        engine = create_engine(f"sqlite:///{db_path}")
-
-        with engine.connect() as conn:
-            # 注意: DB 中时间戳是 UTC 格式 "YYYY-MM-DD HH:MM:SS"
-            user_tz = pytz.timezone("Asia/Shanghai")
-            start_local = datetime.combine(target_date, datetime.min.time())
-            end_local = datetime.combine(target_date, datetime.max.time())
-            start_utc = user_tz.localize(start_local).astimezone(pytz.UTC).strftime("%Y-%m-%d %H:%M:%S")
-            end_utc = user_tz.localize(end_local).astimezone(pytz.UTC).strftime("%Y-%m-%d %H:%M:%S")
+        with get_engine().connect() as conn:
+            # 本地日期转换为 UTC 半开区间
+            start_utc, end_utc = _day_bounds(target_date)
 
             result = conn.execute(
                 text("""SELECT id FROM conversations
                        WHERE user_id = :user_id 
-                       AND created_at >= :start AND created_at <= :end"""),
+                       AND created_at >= :start AND created_at < :end"""),
                 {
                     "user_id": user_id,
                     "start": start_utc,
@@ -706,9 +977,10 @@ class BackgroundTaskScheduler:
         if not self.scheduler:
             return {"running": False, "jobs": []}
 
-        return {
-            "running": self.scheduler.running,
-            "jobs": [
+        now = time.monotonic()
+        snapshot = self._jobs_snapshot
+        if snapshot is None or (now - snapshot[0]) >= self.JOB_STATUS_TTL:
+            jobs = [
                 {
                     "id": job.id,
                     "name": job.name,
@@ -716,6 +988,12 @@ class BackgroundTaskScheduler:
                 }
                 for job in self.scheduler.get_jobs()
             ]
+            snapshot = (now, jobs)
+            self._jobs_snapshot = snapshot
+
+        return {
+            "running": self.scheduler.running,
+            "jobs": list(snapshot[1])
         }
 
 
@@ -12,13 +12,81 @@ Daily Notifications - 每日通知调度模块
 - 支持 should_send = false 跳过无意义推送
 - 推送内容同时注入到用户的聊天记录中
 """
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, NamedTuple, Optional, Tuple
 from datetime import datetime, date, timedelta, time
 import asyncio
+import functools
+import logging
+import sys
+import time as time_module
 import pytz
 
 from app.utils.awake_window import AwakeWindowChecker, get_user_awake_checker
 from app.agents.notification_agent import notification_agent
+from app.config import settings as app_settings
+from app.scheduler.db import acquire_scheduler_lock, get_apple_id
+
+logger = logging.getLogger("daily_notifications")
+
+# 通知节点统一按北京时间计算；模块级常量，避免每次调用都 import / 查找时区对象
+SHANGHAI_TZ = pytz.timezone("Asia/Shanghai")
+
+# 视为紧急的日程类型（小写，比较前先把 event_type 转小写）
+URGENT_TYPES = frozenset({"deadline", "appointment"})
+
+# Python 3.11 之前 datetime.fromisoformat 不接受 Z 后缀
+_FROMISOFORMAT_NEEDS_OFFSET = sys.version_info < (3, 11)
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_iso(value: str) -> datetime:
+    """解析 ISO 时间字符串（兼容 Z 后缀）；同一事件的时间会被多个时段筛选反复解析，结果缓存
+
+    Raises:
+        ValueError: 格式无法解析
+    """
+    # Python 3.11+ 的 fromisoformat 原生支持 Z 后缀，无需改写字符串
+    if _FROMISOFORMAT_NEEDS_OFFSET and value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    return datetime.fromisoformat(value)
+
+
+def _to_datetime(value: Any) -> Optional[datetime]:
+    """把事件里的时间字段（ISO 字符串或 datetime）统一转为 datetime，无法解析时返回 None"""
+    if isinstance(value, datetime):
+        return value
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        return _parse_iso(value)
+    except ValueError:
+        return None
+
+
+class NormalizedEvent(NamedTuple):
+    """读取后预先解析好的日程，后续各时段筛选只做属性判断，不再逐次解析/捕获异常"""
+    raw: Dict[str, Any]
+    start_dt: Optional[datetime]
+    time_period: str
+
+
+def _normalize_event(event: Dict[str, Any]) -> NormalizedEvent:
+    """解析一条日程的开始时间并规范化 time_period（小写）"""
+    return NormalizedEvent(
+        raw=event,
+        start_dt=_to_datetime(event.get("start_time")),
+        time_period=(event.get("time_period") or "").lower(),
+    )
+
+
+def _today() -> date:
+    """北京时间的今天（与去重锁日期保持一致，不依赖服务器本地时区）"""
+    return datetime.now(SHANGHAI_TZ).date()
+
+
+def _date_key(d: date) -> str:
+    """日期 → YYYYmmdd（去重锁 key 的日期部分；直接格式化整数，比 strftime 快）"""
+    return f"{d.year:04d}{d.month:02d}{d.day:02d}"
 
 
 class DailyNotificationScheduler:
@@ -28,10 +96,53 @@ class DailyNotificationScheduler:
     AFTERNOON_CHECKIN_TIME = "12:00"
     EVENING_SWITCH_TIME = "18:00"
     CLOSING_RITUAL_ADVANCE_MINUTES = 15
+
+    # 同一用户短时间内被多个节点/接口重复读取的数据（日程、设置、上下文）缓存秒数
+    USER_DATA_TTL = 60
+
+    # 没有具体开始时间的日程：time_period → 所属时段
+    TIME_PERIOD_BUCKETS = {
+        "morning": "morning",
+        "afternoon": "afternoon",
+        "evening": "evening",
+        "night": "evening",
+    }
+
+    # 没有具体开始时间的日程：time_period → 显示文案
+    TIME_PERIOD_LABELS = {
+        "morning": "上午",
+        "afternoon": "下午",
+        "evening": "晚间",
+        "night": "晚间",
+        "anytime": "",
+    }
+
+    # 节点类型 → 发送方法名
+    PERIOD_SENDERS = {
+        "morning_briefing": "send_morning_briefing",
+        "afternoon_checkin": "send_afternoon_checkin",
+        "evening_switch": "send_evening_switch",
+        "closing_ritual": "send_closing_ritual",
+    }
+
+    # 同时在途的 NotificationAgent 生成调用数上限（可用 DAILY_NOTIFICATION_CONCURRENCY 调整）
+    LLM_CONCURRENCY = app_settings.daily_notification_concurrency
     
     def __init__(self):
         self.db_service = None  # 延迟加载
         self._profile_key_cache = {}  # UUID → Apple ID 缓存
+        # (user_id, 日期) → (缓存时间戳, 当日日程)；跨天时清空
+        self._events_cache: Dict[Tuple[str, date], Tuple[float, List[Dict]]] = {}
+        # _events_cache 对应的"今天"，跨天时整体清空
+        self._events_cache_day: Optional[date] = None
+        # (user_id, 日期) → (划分所依据的事件列表, 按时段划分的日程)
+        self._buckets_cache: Dict[Tuple[str, date], Tuple[List[Dict], Dict[str, List[Dict]]]] = {}
+        # 同时在途的 NotificationAgent 调用数上限
+        self._llm_semaphore = asyncio.Semaphore(self.LLM_CONCURRENCY)
+        # user_id → (缓存时间戳, 通知设置)
+        self._settings_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        # user_id → (缓存时间戳, 最近对话上下文摘要)
+        self._context_cache: Dict[str, Tuple[float, str]] = {}
     
     def _get_db_service(self):
         """延迟加载数据库服务"""
@@ -50,60 +161,36 @@ class DailyNotificationScheduler:
             return self._profile_key_cache[user_id]
         
         try:
-            from sqlalchemy import create_engine, text
-            from app.config import settings
-            db_path = settings.database_url.replace("sqlite:///", "")
-            engine = create_engine(f"sqlite:///{db_path}")
-            with engine.connect() as conn:
-                result = conn.execute(
-                    text("SELECT user_id FROM users WHERE id = :id"),
-                    {"id": user_id}
-                ).fetchone()
-                apple_id = result[0] if result else user_id
-                self._profile_key_cache[user_id] = apple_id
-                return apple_id
+            apple_id = get_apple_id(user_id) or user_id
+            self._profile_key_cache[user_id] = apple_id
+            return apple_id
         except Exception:
             return user_id
             
-    def _acquire_scheduler_lock(self, lock_key: str) -> bool:
-        """基于 SQLite 主键唯一约束的分布式/多进程互斥防重锁"""
-        from sqlalchemy import create_engine, text
-        from sqlalchemy.exc import IntegrityError
-        from app.config import settings
-        
-        db_path = settings.database_url.replace("sqlite:///", "")
-        engine = create_engine(f"sqlite:///{db_path}")
-        
-        try:
-            with engine.connect() as conn:
-                # 确保锁表存在
-                conn.execute(text("""
-                    CREATE TABLE IF NOT EXISTS scheduler_locks (
-                        lock_key VARCHAR(255) PRIMARY KEY,
-                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                    )
-                """))
-                conn.commit()
-                
-                # 抢占锁
-                conn.execute(
-                    text("INSERT INTO scheduler_locks (lock_key) VALUES (:key)"),
-                    {"key": lock_key}
-                )
-                conn.commit()
-                return True
-        except IntegrityError:
-            # 同毫秒内冲突，说明锁被其他 Worker 抢走了
-            return False
-        except Exception as e:
-            error_str = str(e).lower()
-            if "unique constraint failed" in error_str or "database is locked" in error_str:
-                return False
-            print(f"[DailyNotification Lock] Error for {lock_key}: {e}")
-            return False
-        finally:
-            engine.dispose()
+    def _get_fresh(self, cache: Dict, key) -> Any:
+        """读取未超过 USER_DATA_TTL 的缓存值，没有或已过期时返回 None"""
+        entry = cache.get(key)
+        if entry and (time_module.monotonic() - entry[0]) < self.USER_DATA_TTL:
+            return entry[1]
+        return None
+
+    async def _acquire_scheduler_lock(self, lock_key: str) -> bool:
+        """基于 SQLite 主键唯一约束的分布式/多进程互斥防重锁（同步 DB 写入放到线程池，不阻塞事件循环）"""
+        return await asyncio.to_thread(acquire_scheduler_lock, lock_key)
     
+    # ==================== 按节点分发 ====================
+
+    async def send_for_period(self, user_id: str, period: str, force: bool = False) -> bool:
+        """按节点类型（见 PERIOD_SENDERS）给单个用户发送通知
+
+        Raises:
+            ValueError: 未知的节点类型
+        """
+        sender = self.PERIOD_SENDERS.get(period)
+        if sender is None:
+            raise ValueError(f"Unknown notification period: {period}")
+        return await getattr(self, sender)(user_id, force=force)
+
     # ==================== 早安简报 ====================
     
     async def send_morning_briefing(self, user_id: str, force: bool = False) -> bool:
@@ -120,38 +207,27 @@ class DailyNotificationScheduler:
                 return False
                 
             # 并发去重锁：同一天同一个用户只允许一次
-            import pytz
-            today_str = datetime.now(pytz.timezone("Asia/Shanghai")).strftime("%Y%m%d")
-            lock_key = f"daily:MORNING_NOTIFICATION:{user_id}:{today_str}"
+            current_bj = datetime.now(SHANGHAI_TZ)
+            lock_key = f"daily:MORNING_NOTIFICATION:{user_id}:{_date_key(current_bj)}"
             
-            if not self._acquire_scheduler_lock(lock_key):
-                print(f"[DailyNotification] Locked: Morning briefing already grabbed today for {user_id}, skipping.")
+            if not await self._acquire_scheduler_lock(lock_key):
+                logger.debug("Locked: Morning briefing already grabbed today for %s, skipping.", user_id)
                 return False
             
-            # 获取今日日程
-            today_events = await self._get_today_events(user_id)
-            morning_events = self._filter_morning_events(today_events)
+            # 获取今日上午日程 + 随时可做的日程
+            buckets = await self._get_today_buckets(user_id, current_bj.date())
             
             # 获取上下文
-            recent_context = await self._get_recent_context(user_id)
+            recent_context = await self._get_recent_context(user_id, current_bj)
             
             # 交给 NotificationAgent 处理（它会决定是否发送、生成文案、注入对话）
-            result = await notification_agent.generate_periodic_notification(
-                user_id=user_id,
-                period="morning",
-                events=morning_events + [e for e in today_events if e.get("time_period") == "anytime"],
-                recent_context=recent_context
+            morning_events = buckets["morning"] + buckets["anytime"]
+            return await self._generate_and_dispatch(
+                user_id, "morning", "Morning briefing", morning_events, recent_context
             )
             
-            if result.get("should_send"):
-                print(f"[DailyNotification] Morning briefing sent to {user_id}")
-            else:
-                print(f"[DailyNotification] Morning briefing skipped for {user_id}: {result.get('reasoning', '')[:60]}")
-            
-            return result.get("should_send", False)
-            
-        except Exception as e:
-            print(f"[DailyNotification] Error sending morning briefing to {user_id}: {e}")
+        except Exception:
+            logger.exception("Error sending morning briefing to %s", user_id)
             return False
     
     # ==================== 午间检查 ====================
@@ -168,44 +244,33 @@ class DailyNotificationScheduler:
                 return False
             
             checker = get_user_awake_checker(settings)
-            import pytz
-            current_bj = datetime.now(pytz.timezone("Asia/Shanghai"))
+            current_bj = datetime.now(SHANGHAI_TZ)
             if not checker.should_send_notification("afternoon_checkin", current_time=current_bj) and not force:
                 return False
                 
             # 并发去重锁
-            today_str = current_bj.strftime("%Y%m%d")
-            lock_key = f"daily:AFTERNOON_NOTIFICATION:{user_id}:{today_str}"
+            lock_key = f"daily:AFTERNOON_NOTIFICATION:{user_id}:{_date_key(current_bj)}"
             
-            if not self._acquire_scheduler_lock(lock_key):
-                print(f"[DailyNotification] Locked: Afternoon check-in already grabbed today for {user_id}, skipping.")
+            if not await self._acquire_scheduler_lock(lock_key):
+                logger.debug("Locked: Afternoon check-in already grabbed today for %s, skipping.", user_id)
                 return False
             
             # 获取下午日程
-            afternoon_events = await self._get_afternoon_events(user_id)
+            afternoon_events = await self._get_afternoon_events(user_id, current_bj.date())
             
             # 如果下午没有任何事件，直接跳过（不浪费 LLM 调用）
             if not afternoon_events and not force:
                 return False
             
-            recent_context = await self._get_recent_context(user_id)
+            recent_context = await self._get_recent_context(user_id, current_bj)
             
-            result = await notification_agent.generate_periodic_notification(
-                user_id=user_id,
-                period="afternoon",
-                events=afternoon_events,
-                recent_context=recent_context
+            # 交给 NotificationAgent 处理（它会决定是否发送、生成文案、注入对话）
+            return await self._generate_and_dispatch(
+                user_id, "afternoon", "Afternoon check-in", afternoon_events, recent_context
             )
             
-            if result.get("should_send"):
-                print(f"[DailyNotification] Afternoon check-in sent to {user_id}")
-            else:
-                print(f"[DailyNotification] Afternoon check-in skipped for {user_id}")
-            
-            return result.get("should_send", False)
-            
-        except Exception as e:
-            print(f"[DailyNotification] Error sending afternoon check-in to {user_id}: {e}")
+        except Exception:
+            logger.exception("Error sending afternoon check-in to %s", user_id)
             return False
     
     # ==================== 晚间切换 ====================
@@ -222,44 +287,33 @@ class DailyNotificationScheduler:
                 return False
             
             checker = get_user_awake_checker(settings)
-            import pytz
-            current_bj = datetime.now(pytz.timezone("Asia/Shanghai"))
+            current_bj = datetime.now(SHANGHAI_TZ)
             if not checker.should_send_notification("evening_switch", current_time=current_bj) and not force:
                 return False
                 
             # 并发去重锁
-            today_str = current_bj.strftime("%Y%m%d")
-            lock_key = f"daily:EVENING_NOTIFICATION:{user_id}:{today_str}"
+            lock_key = f"daily:EVENING_NOTIFICATION:{user_id}:{_date_key(current_bj)}"
             
-            if not self._acquire_scheduler_lock(lock_key):
-                print(f"[DailyNotification] Locked: Evening switch already grabbed today for {user_id}, skipping.")
+            if not await self._acquire_scheduler_lock(lock_key):
+                logger.debug("Locked: Evening switch already grabbed today for %s, skipping.", user_id)
                 return False
             
             # 获取晚间日程
-            evening_events = await self._get_evening_events(user_id)
+            evening_events = await self._get_evening_events(user_id, current_bj.date())
             
             # 如果晚间没有任何事件，直接跳过
             if not evening_events and not force:
                 return False
             
-            recent_context = await self._get_recent_context(user_id)
+            recent_context = await self._get_recent_context(user_id, current_bj)
             
-            result = await notification_agent.generate_periodic_notification(
-                user_id=user_id,
-                period="evening",
-                events=evening_events,
-                recent_context=recent_context
+            # 交给 NotificationAgent 处理（它会决定是否发送、生成文案、注入对话）
+            return await self._generate_and_dispatch(
+                user_id, "evening", "Evening switch", evening_events, recent_context
             )
             
-            if result.get("should_send"):
-                print(f"[DailyNotification] Evening switch sent to {user_id}")
-            else:
-                print(f"[DailyNotification] Evening switch skipped for {user_id}")
-            
-            return result.get("should_send", False)
-            
-        except Exception as e:
-            print(f"[DailyNotification] Error sending evening switch to {user_id}: {e}")
+        except Exception:
+            logger.exception("Error sending evening switch to %s", user_id)
             return False
     
     # ==================== 睡前仪式 ====================
@@ -278,41 +332,74 @@ class DailyNotificationScheduler:
                 return False
                 
             # 并发去重锁
-            import pytz
-            today_str = datetime.now(pytz.timezone("Asia/Shanghai")).strftime("%Y%m%d")
-            lock_key = f"daily:NIGHT_NOTIFICATION:{user_id}:{today_str}"
+            current_bj = datetime.now(SHANGHAI_TZ)
+            lock_key = f"daily:NIGHT_NOTIFICATION:{user_id}:{_date_key(current_bj)}"
             
-            if not self._acquire_scheduler_lock(lock_key):
-                print(f"[DailyNotification] Locked: Closing ritual already grabbed today for {user_id}, skipping.")
+            if not await self._acquire_scheduler_lock(lock_key):
+                logger.debug("Locked: Closing ritual already grabbed today for %s, skipping.", user_id)
                 return False
             
             # 获取今日全部任务（包含完成和未完成）
-            today_events = await self._get_today_events(user_id)
+            today_events = await self._get_today_events(user_id, current_bj.date())
             
-            recent_context = await self._get_recent_context(user_id)
+            recent_context = await self._get_recent_context(user_id, current_bj)
             
-            result = await notification_agent.generate_periodic_notification(
-                user_id=user_id,
-                period="night",
-                events=today_events,
-                recent_context=recent_context
+            # 交给 NotificationAgent 处理（它会决定是否发送、生成文案、注入对话）
+            return await self._generate_and_dispatch(
+                user_id, "night", "Closing ritual", today_events, recent_context
             )
             
-            if result.get("should_send"):
-                print(f"[DailyNotification] Closing ritual sent to {user_id}")
-            else:
-                print(f"[DailyNotification] Closing ritual skipped for {user_id}")
-            
-            return result.get("should_send", False)
-            
-        except Exception as e:
-            print(f"[DailyNotification] Error sending closing ritual to {user_id}: {e}")
+        except Exception:
+            logger.exception("Error sending closing ritual to %s", user_id)
             return False
     
+    # ==================== 生成与派发 ====================
+
+    async def _generate_and_dispatch(
+        self,
+        user_id: str,
+        period: str,
+        label: str,
+        events: List[Dict],
+        recent_context: str
+    ) -> bool:
+        """调用 NotificationAgent（决定是否发送、生成文案、注入对话），异常只记录日志"""
+        try:
+            async with self._llm_semaphore:
+                result = await notification_agent.generate_periodic_notification(
+                    user_id=user_id,
+                    period=period,
+                    events=events,
+                    recent_context=recent_context
+                )
+        except Exception:
+            logger.exception("Error sending %s to %s", label.lower(), user_id)
+            return False
+
+        if result.get("should_send"):
+            logger.debug("%s sent to %s", label, user_id)
+        else:
+            logger.debug("%s skipped for %s: %.60s", label, user_id, result.get("reasoning", ""))
+        return result.get("should_send", False)
+
     # ==================== 辅助方法 ====================
     
-    async def _get_recent_context(self, user_id: str) -> str:
-        """获取用户最近的对话上下文摘要"""
+    async def _get_recent_context(self, user_id: str, tick_time: Optional[datetime] = None) -> str:
+        """获取用户最近的对话上下文摘要（缓存 USER_DATA_TTL 秒）
+
+        Args:
+            tick_time: 本次发送的北京时间快照，作为"最近 24 小时"的截止点；缺省时取当前时间
+        """
+        cached = self._get_fresh(self._context_cache, user_id)
+        if cached is not None:
+            return cached
+
+        context = await self._load_recent_context(user_id, tick_time)
+        self._context_cache[user_id] = (time_module.monotonic(), context)
+        return context
+
+    async def _load_recent_context(self, user_id: str, tick_time: Optional[datetime] = None) -> str:
+        """查询用户最近 24 小时的对话并整理为摘要"""
         try:
             from app.services.conversation_service import conversation_service
             # 修复：使用 get_user_message_history 替代 get_recent_context
@@ -322,18 +409,18 @@ class DailyNotificationScheduler:
                 limit=10
             )
             # 过滤24小时内的消息
-            user_tz = pytz.timezone("Asia/Shanghai")
-            now = datetime.now(user_tz)
+            now = tick_time or datetime.now(SHANGHAI_TZ)
             cutoff = now - timedelta(hours=24)
             if messages:
                 messages = [
                     m for m in messages
-                    if m.created_at.replace(tzinfo=pytz.UTC).astimezone(user_tz) >= cutoff
+                    if m.created_at.replace(tzinfo=pytz.UTC).astimezone(SHANGHAI_TZ) >= cutoff
                 ]
             if not messages:
                 return ""
             lines = []
-            for msg in messages:
+            # 查询结果按时间倒序；按时间正序输出，新消息只追加在末尾，前面的内容在各节点间保持不变
+            for msg in reversed(messages):
                 role = msg.role if hasattr(msg, 'role') else msg.get("role", "")
                 content = msg.content if hasattr(msg, 'content') else msg.get("content", "")
                 if role in ("user", "assistant") and content:
@@ -343,15 +430,26 @@ class DailyNotificationScheduler:
         except Exception:
             return ""
     
+    def _load_user_preferences(self, user_id: str) -> Dict[str, Any]:
+        """同步读取用户 profile 中的偏好设置"""
+        from app.services.profile_service import profile_service
+        profile_key = self._resolve_profile_key(user_id)
+        profile = profile_service.get_or_create_profile(profile_key)
+        return profile.preferences
+
     async def _get_user_notification_settings(self, user_id: str) -> Dict[str, Any]:
-        """获取用户通知设置"""
+        """获取用户通知设置（缓存 USER_DATA_TTL 秒）"""
+        cached = self._get_fresh(self._settings_cache, user_id)
+        if cached is not None:
+            return cached
+
         try:
-            from app.services.profile_service import profile_service
-            profile_key = self._resolve_profile_key(user_id)
-            profile = profile_service.get_or_create_profile(profile_key)
-            return profile.preferences
+            # UUID → Apple ID 解析和 profile 读取都是同步 DB 查询，放到线程池执行
+            preferences = await asyncio.to_thread(self._load_user_preferences, user_id)
+            self._settings_cache[user_id] = (time_module.monotonic(), preferences)
+            return preferences
         except Exception as e:
-            print(f"[DailyNotification] Error getting user settings: {e}")
+            logger.error("Error getting user settings: %s", e)
             return {
                 "wake_time": "08:00",
                 "sleep_time": "22:00",
@@ -361,101 +459,125 @@ class DailyNotificationScheduler:
                 "closing_ritual_enabled": True
             }
     
-    async def _get_today_events(self, user_id: str) -> List[Dict]:
-        """获取今日所有日程"""
+    async def _get_today_events(self, user_id: str, today: Optional[date] = None) -> List[Dict]:
+        """获取今日所有日程（按 (user_id, 日期) 缓存 USER_DATA_TTL 秒，供各时段筛选复用）"""
+        today = today or _today()
+        return await self._get_events_for_date(user_id, today, today)
+
+    async def _get_events_for_date(self, user_id: str, target_date: date, today: date) -> List[Dict]:
+        """获取指定日期的日程，按 (user_id, 日期) 缓存 USER_DATA_TTL 秒"""
+        self._roll_events_cache(today)
+
+        cached = self._get_fresh(self._events_cache, (user_id, target_date))
+        if cached is not None:
+            return cached
+
         try:
             db = self._get_db_service()
-            today = date.today()
-            events = await db.get_events_for_date(user_id, today)
-            return events if events else []
+            events = await db.get_events_for_date(user_id, target_date)
+            events = events if events else []
+            self._events_cache[(user_id, target_date)] = (time_module.monotonic(), events)
+            return events
         except Exception as e:
-            print(f"[DailyNotification] Error getting today events: {e}")
+            logger.error("Error getting events for %s: %s", target_date, e)
             return []
     
-    async def _get_tomorrow_events(self, user_id: str) -> List[Dict]:
-        """获取明日日程"""
-        try:
-            db = self._get_db_service()
-            tomorrow = date.today() + timedelta(days=1)
-            events = await db.get_events_for_date(user_id, tomorrow)
-            return events if events else []
-        except Exception as e:
-            print(f"[DailyNotification] Error getting tomorrow events: {e}")
-            return []
+    def _roll_events_cache(self, today: date) -> None:
+        """跨天后前一天的缓存不会再命中，整体清空"""
+        if self._events_cache_day != today:
+            self.clear_event_cache()
+            self._events_cache_day = today
+
+    def clear_event_cache(self, user_id: Optional[str] = None) -> None:
+        """清空日程缓存（指定 user_id 时只清该用户），用于日程刚被修改、需要立即读到最新数据的场景"""
+        if user_id is None:
+            self._events_cache.clear()
+            self._buckets_cache.clear()
+            return
+        for cache in (self._events_cache, self._buckets_cache):
+            for key in [key for key in cache if key[0] == user_id]:
+                del cache[key]
+
+    async def _get_tomorrow_events(self, user_id: str, today: Optional[date] = None) -> List[Dict]:
+        """获取明日日程（与今日日程共用缓存）"""
+        today = today or _today()
+        return await self._get_events_for_date(user_id, today + timedelta(days=1), today)
     
-    async def _get_afternoon_events(self, user_id: str) -> List[Dict]:
+    async def _get_today_buckets(self, user_id: str, today: Optional[date] = None) -> Dict[str, List[Dict]]:
+        """获取今日日程按时段划分的结果（与 _get_today_events 的缓存同生命周期）"""
+        today = today or _today()
+        today_events = await self._get_today_events(user_id, today)
+        key = (user_id, today)
+        cached = self._buckets_cache.get(key)
+        # 事件列表仍是同一个缓存对象时，划分结果仍然有效
+        if cached and cached[0] is today_events:
+            return cached[1]
+
+        buckets = self._partition_by_period(today_events)
+        self._buckets_cache[key] = (today_events, buckets)
+        return buckets
+
+    async def _get_afternoon_events(self, user_id: str, today: Optional[date] = None) -> List[Dict]:
         """获取今日下午日程 (12:00-18:00)"""
-        today_events = await self._get_today_events(user_id)
-        return self._filter_time_range_events(today_events, 12, 18)
+        return (await self._get_today_buckets(user_id, today))["afternoon"]
     
-    async def _get_evening_events(self, user_id: str) -> List[Dict]:
+    async def _get_evening_events(self, user_id: str, today: Optional[date] = None) -> List[Dict]:
         """获取今日晚间日程 (18:00-24:00)"""
-        today_events = await self._get_today_events(user_id)
-        return self._filter_time_range_events(today_events, 18, 24)
-    
-    def _filter_morning_events(self, events: List[Dict]) -> List[Dict]:
-        """筛选上午日程 (06:00-12:00)"""
-        return self._filter_time_range_events(events, 6, 12)
+        return (await self._get_today_buckets(user_id, today))["evening"]
     
-    def _filter_time_range_events(
-        self, 
-        events: List[Dict], 
-        start_hour: int, 
-        end_hour: int
-    ) -> List[Dict]:
-        """筛选指定时间范围内的日程"""
-        filtered = []
-        for event in events:
-            start_time = event.get("start_time")
-            if not start_time:
-                # 检查 time_period
-                time_period = event.get("time_period", "").lower()
-                if start_hour < 12 and time_period == "morning":
-                    filtered.append(event)
-                elif 12 <= start_hour < 18 and time_period == "afternoon":
-                    filtered.append(event)
-                elif start_hour >= 18 and time_period in ["evening", "night"]:
-                    filtered.append(event)
+    def _partition_by_period(self, events: List[Dict]) -> Dict[str, List[Dict]]:
+        """一次遍历把日程划分到 上午 (06-12) / 下午 (12-18) / 晚间 (18-24) 三个时段
+
+        没有具体开始时间的日程按 time_period 归入对应时段；
+        另外 time_period 为 anytime 的日程单独放在 "anytime" 中（早安简报会一并带上）。
+        """
+        buckets: Dict[str, List[Dict]] = {"morning": [], "afternoon": [], "evening": [], "anytime": []}
+        for event in map(_normalize_event, events):
+            if event.time_period == "anytime":
+                buckets["anytime"].append(event.raw)
+
+            if not event.raw.get("start_time"):
+                bucket = self.TIME_PERIOD_BUCKETS.get(event.time_period)
+                if bucket:
+                    buckets[bucket].append(event.raw)
                 continue
-            
-            # 解析时间
-            try:
-                if isinstance(start_time, str):
-                    event_time = datetime.fromisoformat(start_time.replace("Z", "+00:00"))
-                elif isinstance(start_time, datetime):
-                    event_time = start_time
-                else:
-                    continue
-                
-                event_hour = event_time.hour
-                if start_hour <= event_hour < end_hour:
-                    filtered.append(event)
-            except Exception:
+
+            # 开始时间无法解析的日程不归入任何时段
+            if event.start_dt is None:
                 continue
+
+            event_hour = event.start_dt.hour
+            if 6 <= event_hour < 12:
+                buckets["morning"].append(event.raw)
+            elif 12 <= event_hour < 18:
+                buckets["afternoon"].append(event.raw)
+            elif event_hour >= 18:
+                buckets["evening"].append(event.raw)
         
         # 按时间排序
-        filtered.sort(key=lambda e: e.get("start_time", "") or "")
-        return filtered
+        for name in ("morning", "afternoon", "evening"):
+            buckets[name].sort(key=lambda e: e.get("start_time", "") or "")
+        return buckets
     
-    def _is_urgent(self, task: Dict) -> bool:
-        """判断任务是否紧急"""
+    def _is_urgent(self, task: Dict, tick_time: Optional[datetime] = None) -> bool:
+        """判断任务是否紧急
+
+        Args:
+            tick_time: 本次发送的北京时间快照（aware），缺省时取当前时间
+        """
         # 检查 deadline
-        deadline = task.get("deadline")
-        if deadline:
-            try:
-                if isinstance(deadline, str):
-                    deadline_dt = datetime.fromisoformat(deadline.replace("Z", "+00:00"))
-                else:
-                    deadline_dt = deadline
-                
-                tomorrow = datetime.now() + timedelta(days=1)
-                if deadline_dt < tomorrow:
-                    return True
-            except Exception:
-                pass
+        deadline_dt = _to_datetime(task.get("deadline"))
+        if deadline_dt is not None:
+            now = tick_time or datetime.now(SHANGHAI_TZ)
+            # naive deadline 与日程一样按北京时间理解；aware 的直接按绝对时间比较
+            if deadline_dt.tzinfo is None:
+                now = now.astimezone(SHANGHAI_TZ).replace(tzinfo=None)
+            tomorrow = now + timedelta(days=1)
+            if deadline_dt < tomorrow:
+                return True
         
-        event_type = task.get("event_type", "").lower()
-        if event_type in ["deadline", "appointment"]:
+        event_type = (task.get("event_type") or "").lower()
+        if event_type in URGENT_TYPES:
             return True
         
         if task.get("is_mentally_demanding") and task.get("is_physically_demanding"):
@@ -467,25 +589,13 @@ class DailyNotificationScheduler:
         """格式化事件时间显示"""
         start_time = event.get("start_time")
         if not start_time:
-            time_period = event.get("time_period", "")
-            period_map = {
-                "morning": "上午",
-                "afternoon": "下午",
-                "evening": "晚间",
-                "night": "晚间",
-                "anytime": ""
-            }
-            return period_map.get(time_period.lower(), "")
+            time_period = event.get("time_period") or ""
+            return self.TIME_PERIOD_LABELS.get(time_period.lower(), "")
         
-        try:
-            if isinstance(start_time, str):
-                event_time = datetime.fromisoformat(start_time.replace("Z", "+00:00"))
-            else:
-                event_time = start_time
-            
-            return f"（{event_time.strftime('%H:%M')}）"
-        except Exception:
+        event_time = _to_datetime(start_time)
+        if event_time is None:
             return ""
+        return f"（{event_time.strftime('%H:%M')}）"
 
 
 # 全局实例
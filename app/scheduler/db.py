@@ -0,0 +1,366 @@
+"""
+Scheduler DB - 调度器共享的数据库工具
+
+BackgroundTaskScheduler 与 DailyNotificationScheduler 共用的 SQLite 访问逻辑，
+包括基于 scheduler_locks 表主键唯一约束的多进程防重锁、事件提醒去重表 sent_reminders、
+记忆精炼进度表 memory_consolidations，以及 UUID → Apple ID 解析。
+"""
+import functools
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import bindparam, create_engine, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+from app.config import settings
+from app.services.db import apply_sqlite_pragmas
+
+logger = logging.getLogger("scheduler")
+
+# ---- 高频调用的语句，模块加载时构造一次 ----
+
+_INSERT_LOCK_SQL = text("INSERT OR IGNORE INTO scheduler_locks (lock_key) VALUES (:key)")
+
+_PURGE_LOCKS_SQL = text("DELETE FROM scheduler_locks WHERE created_at < datetime('now', :age)")
+
+# 经 exec_driver_sql 执行，保持为普通字符串
+_SENT_REMINDERS_SQL = """
+    SELECT user_id, event_id, event_time FROM sent_reminders
+    WHERE event_time >= :since
+"""
+
+# event_time 为北京时间 YYYYmmddHHMM，按同一格式算出截止点后直接做字符串比较（走 event_time 索引）
+_PURGE_SENT_REMINDERS_SQL = text("""
+    DELETE FROM sent_reminders
+    WHERE event_time < strftime('%Y%m%d%H%M', 'now', '+8 hours', :age)
+""")
+
+_INSERT_SENT_REMINDER_SQL = text("""
+    INSERT OR IGNORE INTO sent_reminders (user_id, event_id, event_time)
+    VALUES (:user_id, :event_id, :event_time)
+""")
+
+_APPLE_ID_SQL = text("SELECT user_id FROM users WHERE id = :id")
+
+# 用户画像的版本戳：任一 profile 保存都会刷新 updated_at
+_PROFILES_VERSION_SQL = "SELECT MAX(updated_at) FROM user_profiles"
+
+_APPLE_IDS_SQL = text("SELECT id, user_id FROM users WHERE id IN :ids").bindparams(
+    bindparam("ids", expanding=True)
+)
+
+
+@functools.lru_cache(maxsize=1)
+def get_engine() -> Engine:
+    """调度器共享的 SQLAlchemy engine（进程内单例，复用连接池）"""
+    db_path = settings.database_url.replace("sqlite:///", "")
+    # 本地 SQLite 文件连接不会像网络连接那样失效，省掉每次借出连接时的 ping 查询
+    engine = create_engine(f"sqlite:///{db_path}")
+    apply_sqlite_pragmas(engine)
+    return engine
+
+
+# scheduler_locks 中锁记录的保留天数（锁 key 都按天/分钟区分，过期后不再使用）
+LOCK_RETENTION_DAYS = 7
+
+# sent_reminders 中提醒记录的保留天数（事件开始后去重记录就不再被查询）
+SENT_REMINDER_RETENTION_DAYS = 2
+
+# 写锁在 busy_timeout 内仍拿不到时，acquire_scheduler_lock 额外重试的次数
+LOCK_BUSY_RETRIES = 1
+
+# 本进程已确认存在的调度器自建表，CREATE TABLE IF NOT EXISTS 只需执行一次
+_ensured_tables: Set[str] = set()
+_ensured_tables_lock = threading.Lock()
+
+
+def _ensure_table_once(conn, name: str, create: Callable) -> None:
+    """首次访问某张调度器自建表时执行 create(conn) 建表，之后直接跳过"""
+    if name in _ensured_tables:
+        return
+    with _ensured_tables_lock:
+        if name not in _ensured_tables:
+            create(conn)
+            _ensured_tables.add(name)
+
+
+def _create_scheduler_locks_table(conn) -> None:
+    """创建多进程防重锁表，并顺带清理过期的锁"""
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS scheduler_locks (
+            lock_key VARCHAR(255) PRIMARY KEY,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
+    conn.execute(_PURGE_LOCKS_SQL, {"age": f"-{LOCK_RETENTION_DAYS} days"})
+    conn.commit()
+
+
+def purge_scheduler_locks() -> int:
+    """删除早于 LOCK_RETENTION_DAYS 天的锁记录，返回删除的行数
+
+    锁 key 都带有日期/分钟，过了当天就不会再被查询，只会让表和主键索引持续膨胀。
+    """
+    try:
+        with get_engine().connect() as conn:
+            _ensure_table_once(conn, "scheduler_locks", _create_scheduler_locks_table)
+            result = conn.execute(_PURGE_LOCKS_SQL, {"age": f"-{LOCK_RETENTION_DAYS} days"})
+            conn.commit()
+            return result.rowcount
+    except Exception as e:
+        logger.error("Error purging scheduler locks: %s", e)
+        return 0
+
+
+def acquire_scheduler_lock(lock_key: str) -> bool:
+    """基于 SQLite 主键唯一约束的分布式/多进程互斥防重锁
+
+    Args:
+        lock_key: 锁的唯一标识（通常包含任务类型、用户、日期/时间）
+
+    Returns:
+        True 表示本进程抢到了锁；False 表示锁已被其他 Worker 持有或获取失败
+    """
+    # "database is locked" 只说明 busy_timeout 内没抢到写锁，不代表锁已被占用，重试一次
+    for attempt in range(LOCK_BUSY_RETRIES + 1):
+        try:
+            with get_engine().connect() as conn:
+                _ensure_table_once(conn, "scheduler_locks", _create_scheduler_locks_table)
+
+                # 抢占锁：主键冲突时 OR IGNORE 静默跳过，rowcount 为 0 说明锁已被其他 Worker 抢走
+                result = conn.execute(_INSERT_LOCK_SQL, {"key": lock_key})
+                conn.commit()
+                return result.rowcount == 1
+        except OperationalError as e:
+            if "database is locked" in str(e).lower() and attempt < LOCK_BUSY_RETRIES:
+                logger.warning("Lock DB busy for %s, retrying", lock_key)
+                continue
+            logger.error("Lock error for %s: %s", lock_key, e)
+            return False
+        except Exception as e:
+            logger.error("Lock error for %s: %s", lock_key, e)
+            return False
+    return False
+
+
+# 事件提醒查询会 JOIN user_profiles；该表平时由画像服务建表，调度器先启动时在这里补建（结构与画像服务一致）
+_USER_PROFILES_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS user_profiles (
+        id TEXT PRIMARY KEY,
+        user_id TEXT NOT NULL,
+        profile_data TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL
+    )
+"""
+
+# 调度器热点查询依赖的索引（CREATE INDEX IF NOT EXISTS，可重复执行）
+SCHEDULER_INDEXES = [
+    # 事件提醒：按 start_time 范围扫描未完成的真实事件
+    "CREATE INDEX IF NOT EXISTS idx_events_start_time ON events (start_time) WHERE is_template = 0",
+    # 事件提醒：按 event_date 范围查找重复事件已存在的真实实例
+    "CREATE INDEX IF NOT EXISTS idx_events_routine_instance_date ON events (event_date) "
+    "WHERE is_template = 0 AND parent_routine_id IS NOT NULL",
+    # 每日通知：按 user_id + event_date 读取单个用户当天日程（events 表此前没有 user_id 索引）
+    "CREATE INDEX IF NOT EXISTS idx_events_user_event_date ON events (user_id, event_date)",
+    # 事件提醒：只扫描模板事件用于虚拟展开（模板占事件表的极小部分）
+    "CREATE INDEX IF NOT EXISTS idx_events_templates ON events (user_id) WHERE is_template = 1",
+    # 待发送通知：每分钟按 status + scheduled_for 领取到期的通知
+    "CREATE INDEX IF NOT EXISTS idx_notifications_status_scheduled ON notifications (status, scheduled_for)",
+    # 近 7 天活跃用户：last_active_at OR created_at，两列各自有索引时 SQLite 可走 OR 优化而非全表扫描
+    "CREATE INDEX IF NOT EXISTS idx_users_last_active_at ON users (last_active_at)",
+    "CREATE INDEX IF NOT EXISTS idx_users_created_at ON users (created_at)",
+    # 事件提醒：按 Apple ID JOIN user_profiles（与画像服务建的索引同名，已存在时跳过）
+    "CREATE INDEX IF NOT EXISTS idx_user_profiles_user_id ON user_profiles (user_id)",
+    # 通知触发表：每分钟取 MAX(updated_at) 判断作息设置是否变化，走索引无需全表扫描
+    "CREATE INDEX IF NOT EXISTS idx_user_profiles_updated_at ON user_profiles (updated_at)",
+    # 每日复盘：按日期范围找出有对话的用户，覆盖索引无需回表
+    "CREATE INDEX IF NOT EXISTS idx_conversations_created_user ON conversations (created_at, user_id)",
+]
+
+
+def ensure_scheduler_indexes() -> None:
+    """创建调度器查询所需的表和索引（调度器启动时调用一次，均为 IF NOT EXISTS，可重复执行）"""
+    with get_engine().connect() as conn:
+        for ddl in (_USER_PROFILES_TABLE_SQL, *SCHEDULER_INDEXES):
+            try:
+                conn.execute(text(ddl))
+                conn.commit()
+            except Exception as e:
+                # 某张表尚未创建等情况下跳过该索引，不影响其余索引和调度器启动
+                conn.rollback()
+                logger.warning("Could not ensure scheduler table/index (%s): %s", ddl.strip(), e)
+
+
+def _create_sent_reminders_table(conn) -> None:
+    """创建事件提醒去重表（每次事件提醒只占一行），并顺带清理过期的记录"""
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS sent_reminders (
+            user_id VARCHAR(255) NOT NULL,
+            event_id VARCHAR(255) NOT NULL,
+            event_time VARCHAR(12) NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, event_id, event_time)
+        )
+    """))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS idx_sent_reminders_event_time ON sent_reminders (event_time)"
+    ))
+    conn.execute(_PURGE_SENT_REMINDERS_SQL, {"age": f"-{SENT_REMINDER_RETENTION_DAYS} days"})
+    conn.commit()
+
+
+def purge_sent_reminders() -> int:
+    """删除事件时间早于 SENT_REMINDER_RETENTION_DAYS 天的提醒记录，返回删除的行数
+
+    去重只需要覆盖当天及之后的事件（见 get_sent_reminders），旧记录只会让表持续膨胀。
+    """
+    try:
+        with get_engine().connect() as conn:
+            _ensure_table_once(conn, "sent_reminders", _create_sent_reminders_table)
+            result = conn.execute(_PURGE_SENT_REMINDERS_SQL, {"age": f"-{SENT_REMINDER_RETENTION_DAYS} days"})
+            conn.commit()
+            return result.rowcount
+    except Exception as e:
+        logger.error("Error purging sent reminders: %s", e)
+        return 0
+
+
+def get_sent_reminders(since_event_time: str) -> Set[Tuple[str, str, str]]:
+    """一次性读取事件时间不早于 since_event_time 的已发送提醒
+
+    Args:
+        since_event_time: 事件开始时间下限，格式 YYYYmmddHHMM
+
+    Returns:
+        {(user_id, event_id, event_time), ...}，供调用方做 O(1) 去重判断
+    """
+    try:
+        with get_engine().connect() as conn:
+            _ensure_table_once(conn, "sent_reminders", _create_sent_reminders_table)
+            # 每分钟调用的只读查询，直接交给驱动执行，省去 text() 编译
+            rows = conn.exec_driver_sql(_SENT_REMINDERS_SQL, {"since": since_event_time}).fetchall()
+            return {(row[0], row[1], row[2]) for row in rows}
+    except Exception as e:
+        logger.error("Error loading sent reminders: %s", e)
+        return set()
+
+
+def mark_reminder_sent(user_id: str, event_id: str, event_time: str) -> bool:
+    """登记一次事件提醒（主键唯一约束保证多 Worker 下只有一个成功）
+
+    Args:
+        user_id: 用户 UUID
+        event_id: 事件 ID（虚拟实例为 virtual_xxx）
+        event_time: 事件开始时间，格式 YYYYmmddHHMM
+
+    Returns:
+        True 表示本进程负责发送；False 表示已发送过或被其他 Worker 抢先
+    """
+    try:
+        with get_engine().connect() as conn:
+            _ensure_table_once(conn, "sent_reminders", _create_sent_reminders_table)
+            # 主键冲突时 OR IGNORE 静默跳过，rowcount 为 0 即表示已登记过，无需靠异常判断
+            result = conn.execute(
+                _INSERT_SENT_REMINDER_SQL,
+                {"user_id": user_id, "event_id": event_id, "event_time": event_time}
+            )
+            conn.commit()
+            return result.rowcount == 1
+    except Exception as e:
+        if "database is locked" in str(e).lower():
+            return False
+        logger.error("Error marking reminder sent for %s: %s", event_id, e)
+        return False
+
+
+def _create_memory_consolidations_table(conn) -> None:
+    """创建记忆精炼进度表（每个用户一行，记录最近一次成功精炼的 UTC 时间）"""
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS memory_consolidations (
+            user_id VARCHAR(255) PRIMARY KEY,
+            last_consolidated_at DATETIME NOT NULL
+        )
+    """))
+    conn.commit()
+
+
+def get_consolidated_users(since: str) -> Set[str]:
+    """读取在 since（UTC "YYYY-MM-DD HH:MM:SS"）之后已完成记忆精炼的用户
+
+    每周任务中途失败或重跑时，据此跳过已处理的用户，从断点继续。
+    """
+    try:
+        with get_engine().connect() as conn:
+            _ensure_table_once(conn, "memory_consolidations", _create_memory_consolidations_table)
+            rows = conn.execute(
+                text("SELECT user_id FROM memory_consolidations WHERE last_consolidated_at >= :since"),
+                {"since": since}
+            ).fetchall()
+            return {row[0] for row in rows}
+    except Exception as e:
+        logger.error("Error loading memory consolidation checkpoints: %s", e)
+        return set()
+
+
+def mark_consolidated(user_id: str) -> None:
+    """记录用户刚完成一次记忆精炼（逐个用户落库，崩溃后可续跑）"""
+    try:
+        with get_engine().connect() as conn:
+            _ensure_table_once(conn, "memory_consolidations", _create_memory_consolidations_table)
+            conn.execute(
+                text("""INSERT INTO memory_consolidations (user_id, last_consolidated_at)
+                       VALUES (:user_id, CURRENT_TIMESTAMP)
+                       ON CONFLICT(user_id) DO UPDATE SET last_consolidated_at = excluded.last_consolidated_at"""),
+                {"user_id": user_id}
+            )
+            conn.commit()
+    except Exception as e:
+        logger.error("Error saving memory consolidation checkpoint for %s: %s", user_id, e)
+
+
+def get_apple_id(uuid_id: str) -> Optional[str]:
+    """从 UUID (users.id) 获取 Apple ID (users.user_id)
+
+    user_profiles 表以 Apple ID 为 key，而调度器内部以 UUID 标识用户。
+
+    Returns:
+        Apple ID 字符串，如果找不到则返回 None
+    """
+    with get_engine().connect() as conn:
+        result = conn.execute(_APPLE_ID_SQL, {"id": uuid_id}).fetchone()
+        return result[0] if result else None
+
+
+def get_apple_ids(uuid_ids: List[str]) -> Dict[str, str]:
+    """批量获取 UUID → Apple ID 映射（一次 IN 查询）
+
+    Returns:
+        {uuid: apple_id}，找不到 Apple ID 的 UUID 不在结果中
+    """
+    ids = [uid for uid in uuid_ids if uid]
+    if not ids:
+        return {}
+
+    with get_engine().connect() as conn:
+        rows = conn.execute(_APPLE_IDS_SQL, {"ids": ids}).fetchall()
+        return {row[0]: row[1] for row in rows if row[1]}
+
+
+def get_profiles_version() -> Optional[str]:
+    """user_profiles 最近一次更新时间，作为作息/通知设置的版本戳
+
+    API 进程与独立运行的调度器进程不共享内存，调度器据此发现设置变化。
+
+    Returns:
+        MAX(updated_at)；表不存在或查询失败时返回 None
+    """
+    try:
+        with get_engine().connect() as conn:
+            row = conn.exec_driver_sql(_PROFILES_VERSION_SQL).fetchone()
+            return row[0] if row else None
+    except Exception as e:
+        logger.debug("Could not read user_profiles version: %s", e)
+        return None
@@ -12,16 +12,27 @@ load_dotenv(env_file)
 
 from app.scheduler.background_tasks import task_scheduler
 
+from app.utils.logger import enable_queue_logging
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
+# Emit log records off the scheduler's event loop
+enable_queue_logging()
 logger = logging.getLogger(__name__)
 
 async def main():
     """Run the scheduler service"""
     logger.info("Starting UniLife Scheduler Service...")
+
+    # Python 3.12+: coroutines that finish synchronously (e.g. ticks with nothing due)
+    # complete without a round-trip through the event loop
+    loop = asyncio.get_running_loop()
+    eager_task_factory = getattr(asyncio, "eager_task_factory", None)
+    if eager_task_factory is not None:
+        loop.set_task_factory(eager_task_factory)
     
     # Start the scheduler
     task_scheduler.start()
@@ -32,7 +43,6 @@ async def main():
     def handle_signal():
         stop_event.set()
     
-    loop = asyncio.get_running_loop()
     for sig in (signal.SIGINT, signal.SIGTERM):
         loop.add_signal_handler(sig, handle_signal)
     
@@ -46,6 +56,14 @@ async def main():
     logger.info("Scheduler Service Halted")
 
 if __name__ == "__main__":
+    # uvloop ships with uvicorn[standard] on non-Windows platforms; use it when available
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        logger.info("Using uvloop event loop")
+    except ImportError:
+        pass
+
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
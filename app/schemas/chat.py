@@ -2,7 +2,7 @@
 Chat Schemas - Request and Response models for chat API
 """
 from typing import Dict, Any, List, Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, SkipValidation
 
 
 class ChatContext(BaseModel):
@@ -24,7 +24,8 @@ class ActionResult(BaseModel):
     """Result of an action taken by the agent"""
     type: str = Field(..., description="Action type: create_event, update_event, etc.")
     event_id: Optional[str] = Field(None, description="Event ID if applicable")
-    event: Optional[Dict[str, Any]] = Field(None, description="Event data if applicable")
+    # Server-built event dicts: keep the object schema but skip per-response validation/copying
+    event: Optional[SkipValidation[Dict[str, Any]]] = Field(None, description="Event data if applicable")
 
 
 class Suggestion(BaseModel):
@@ -60,7 +61,7 @@ class QueryStats(BaseModel):
 class QueryResult(BaseModel):
     """Structured query result for frontend rendering"""
     type: str = Field(..., description="Result type: events, schedule_overview, statistics, routine")
-    events: Optional[List[Dict[str, Any]]] = Field(None, description="List of events if type is 'events'")
+    events: Optional[SkipValidation[List[Dict[str, Any]]]] = Field(None, description="List of events if type is 'events'")
     statistics: Optional[QueryStats] = Field(None, description="Statistics data")
     count: Optional[int] = Field(None, description="Total count of results")
 
@@ -75,9 +76,9 @@ class ChatResponse(BaseModel):
     query_results: Optional[List[QueryResult]] = Field(None, description="Structured query results for UI rendering")
     conversation_id: Optional[str] = Field(None, description="Conversation ID for continuing this conversation")
 
-    # Smart decision fields
-    auto_action: Optional[Dict[str, Any]] = Field(None, description="Auto-executed action based on user preference (probability > 50%)")
-    alternative_options: Optional[List[Dict[str, Any]]] = Field(None, description="Alternative options if user is not satisfied with auto_action")
+    # Smart decision fields (server-built dicts, not re-validated)
+    auto_action: Optional[SkipValidation[Dict[str, Any]]] = Field(None, description="Auto-executed action based on user preference (probability > 50%)")
+    alternative_options: Optional[SkipValidation[List[Dict[str, Any]]]] = Field(None, description="Alternative options if user is not satisfied with auto_action")
     confidence: Optional[int] = Field(None, description="Confidence level of auto_action (0-100)")
 
 
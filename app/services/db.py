@@ -3,7 +3,8 @@ Database Service - SQLite with SQLAlchemy
 """
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta, date, timezone
-from sqlalchemy import create_engine, Column, String, Integer, DateTime, Boolean, JSON, Numeric, Float, func
+from sqlalchemy import create_engine, event as sa_event, Column, String, Integer, DateTime, Boolean, JSON, Numeric, Float, func
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 import uuid
@@ -55,6 +56,41 @@ DEFAULT_SOCIAL_PROFILE = {
 }
 
 
+# ============ SQLite Tuning ============
+
+# 每个新连接执行一次的 PRAGMA
+# - WAL: 读写互不阻塞（后台任务读取时 API 仍可写入）
+# - synchronous=NORMAL: WAL 模式下安全且显著减少 fsync
+# - busy_timeout: 多进程（API / 调度器）同时写入时等待写锁，而不是立即报 database is locked
+SQLITE_CONNECT_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+)
+
+
+def apply_sqlite_pragmas(engine: Engine) -> Engine:
+    """为 SQLite engine 注册 connect 监听器，在每个新连接上设置 PRAGMA
+
+    非 SQLite engine 原样返回。
+    """
+    if engine.dialect.name != "sqlite":
+        return engine
+
+    @sa_event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for pragma in SQLITE_CONNECT_PRAGMAS:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    return engine
+
+
 # ============ Database Models ============
 
 class UserModel(Base):
@@ -438,6 +474,7 @@ class DatabaseService:
                 settings.database_url,
                 connect_args={"check_same_thread": False}  # SQLite specific
             )
+            apply_sqlite_pragmas(self.engine)
 
             # Create session factory
             self.SessionLocal = sessionmaker(
@@ -8,7 +8,8 @@ import httpx
 import json
 import time as _time
 import asyncio
-from typing import List, Optional, Dict, Any
+import logging
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime
 from sqlalchemy import create_engine, Column, String, DateTime, Integer, Text, JSON
 from sqlalchemy.orm import sessionmaker, Session
@@ -26,6 +27,9 @@ from app.models.notification import (
     BUILTIN_TEMPLATES
 )
 from app.models.device import DeviceDB
+from app.services.db import apply_sqlite_pragmas
+
+logger = logging.getLogger("notification_service")
 
 # Create base for notification models
 Base = declarative_base()
@@ -83,6 +87,9 @@ class NotificationService:
     For production use with APNs, you'll need to configure Apple Developer credentials.
     """
 
+    # 同一批推送并发请求数上限（HTTP/2 单连接多路复用，低于 httpx 连接池上限即可）
+    PUSH_CONCURRENCY = 20
+
     def __init__(self):
         self.engine = None
         self.SessionLocal = None
@@ -113,6 +120,7 @@ class NotificationService:
                 settings.database_url,
                 connect_args={"check_same_thread": False}
             )
+            apply_sqlite_pragmas(self.engine)
 
             self.SessionLocal = sessionmaker(
                 autocommit=False,
@@ -124,7 +132,7 @@ class NotificationService:
             Base.metadata.create_all(bind=self.engine)
 
             self._initialized = True
-            print("Notification service initialized")
+            logger.info("Notification service initialized")
 
     def _ensure_initialized(self):
         """Ensure service is initialized"""
@@ -192,7 +200,7 @@ class NotificationService:
                 if platform:
                     query = query.filter(DeviceDB.platform == platform.value)
                 devices = query.all()
-                print(f"[Notification] Found {len(devices)} active devices for user {user_id}")
+                logger.debug("Found %d active devices for user %s", len(devices), user_id)
 
             if not devices:
                 # No devices found, create a failed record
@@ -210,28 +218,51 @@ class NotificationService:
                 return self._save_record(record)
 
             # Send to each device
-            results = []
-            for device in devices:
-                device_platform = self._map_device_to_notification_platform(device.platform)
-                record = NotificationRecord(
+            records = [
+                NotificationRecord(
                     user_id=user_id,
                     device_id=device.id,
-                    platform=device_platform,
+                    platform=self._map_device_to_notification_platform(device.platform),
                     type=notification_type,
                     priority=priority,
                     payload=payload,
                     scheduled_for=scheduled_for
                 )
+                for device in devices
+            ]
 
-                if scheduled_for and scheduled_for > datetime.utcnow():
-                    # Scheduled for later, save as pending
-                    results.append(self._save_record(record))
-                else:
-                    # Send immediately
-                    result = await self._send_to_device(record, device)
-                    results.append(result)
+            if scheduled_for and scheduled_for > datetime.utcnow():
+                # Scheduled for later, save as pending
+                results = [self._save_record(record) for record in records]
+            else:
+                # Send immediately (多设备并发推送)
+                results = await self._send_batch(list(zip(records, devices)))
 
-            return results[0] if len(results) == 1 else results[0]
+            return results[0]
+
+    async def _send_batch(
+        self,
+        items: List[tuple]
+    ) -> List[NotificationRecord]:
+        """
+        并发发送一批 (record, device)，复用同一个 HTTP/2 客户端
+
+        并发数受 PUSH_CONCURRENCY 限制；返回结果与输入顺序一致。
+        """
+        semaphore = asyncio.Semaphore(self.PUSH_CONCURRENCY)
+
+        async def send_one(record: NotificationRecord, device: DeviceDB) -> NotificationRecord:
+            async with semaphore:
+                try:
+                    return await self._send_to_device(record, device)
+                except Exception as e:
+                    # 单条失败不影响同批其他推送
+                    logger.error("Error sending notification %s: %s", record.id, e)
+                    record.status = NotificationStatus.FAILED
+                    record.error_message = str(e)
+                    return self._save_record(record)
+
+        return list(await asyncio.gather(*(send_one(record, device) for record, device in items)))
 
     async def send_template(
         self,
@@ -333,7 +364,7 @@ class NotificationService:
             
             with open(key_path, "r") as f:
                 self._apns_key_secret = f.read()
-            print(f"[APNs] Loaded .p8 key file from {key_path}")
+            logger.info("[APNs] Loaded .p8 key file from %s", key_path)
         
         # 签发新 JWT
         algorithm = "ES256"
@@ -345,7 +376,7 @@ class NotificationService:
             algorithm=algorithm, headers=headers
         )
         self._apns_jwt_issued_at = now
-        print(f"[APNs] JWT token refreshed (valid for {self._apns_jwt_ttl // 60} min)")
+        logger.info("[APNs] JWT token refreshed (valid for %d min)", self._apns_jwt_ttl // 60)
         
         return self._apns_jwt_token
 
@@ -375,7 +406,7 @@ class NotificationService:
         try:
             # Check if APNs is configured
             if not all([settings.apns_key_id, settings.apns_team_id, settings.apns_key_path, settings.apns_bundle_id]):
-                print("[APNs] Configuration missing, falling back to mock send.")
+                logger.warning("[APNs] Configuration missing, falling back to mock send.")
                 return await self._send_apns_mock(record, device)
 
             # 获取缓存的 JWT Token（过期时自动刷新）
@@ -384,7 +415,7 @@ class NotificationService:
             except FileNotFoundError as e:
                 record.status = NotificationStatus.FAILED
                 record.error_message = str(e)
-                print(f"[APNs] {e}")
+                logger.error("[APNs] %s", e)
                 return self._save_record(record)
 
             # Determine endpoint
@@ -410,7 +441,7 @@ class NotificationService:
             if record.payload.data:
                 full_payload.update(record.payload.data)
 
-            print(f"[APNs] Sending to {device.token[:8]}... via httpx")
+            logger.debug("[APNs] Sending to %s... via httpx", device.token[:8])
             
             # 使用 httpx HTTP/2 异步请求（长连接复用，无子进程开销）
             client = await self._get_http_client()
@@ -427,12 +458,12 @@ class NotificationService:
             if status_code == 200:
                 record.status = NotificationStatus.SENT
                 record.sent_at = datetime.utcnow()
-                print(f"[APNs] Sent successfully. Status: 200. Token: {device.token[:10]}...")
+                logger.info("[APNs] Sent successfully. Token: %s...", device.token[:10])
             else:
                 response_body = response.text
                 record.status = NotificationStatus.FAILED
                 record.error_message = f"APNs Error {status_code}: {response_body}"
-                print(f"[APNs] Failed. Status: {status_code}. Body: {response_body}")
+                logger.warning("[APNs] Failed. Status: %d. Body: %s", status_code, response_body)
                 
                 # 410 = token 永久失效（App 已卸载或 token 已更新）
                 # Apple 官方要求收到 410 后停止向该 token 发送推送
@@ -443,21 +474,20 @@ class NotificationService:
                             if db_device:
                                 db_device.is_active = False
                                 session.commit()
-                                print(f"[APNs] Deactivated expired device {device.token[:10]}...")
+                                logger.info("[APNs] Deactivated expired device %s...", device.token[:10])
                     except Exception as deactivate_err:
-                        print(f"[APNs] Failed to deactivate device: {deactivate_err}")
+                        logger.error("[APNs] Failed to deactivate device: %s", deactivate_err)
                 
                 # 403 = JWT 被拒绝，可能是 token 过期了，清除缓存让下次刷新
                 if status_code == 403:
                     self._apns_jwt_token = None
                     self._apns_jwt_issued_at = 0
-                    print(f"[APNs] JWT rejected, cache cleared for next retry")
+                    logger.warning("[APNs] JWT rejected, cache cleared for next retry")
 
             return self._save_record(record)
 
         except Exception as e:
-            import traceback
-            traceback.print_exc()
+            logger.exception("[APNs] Unexpected error sending %s", record.id)
             record.status = NotificationStatus.FAILED
             record.error_message = f"Internal Error: {str(e)}"
             return self._save_record(record)
@@ -545,12 +575,13 @@ class NotificationService:
             refreshed = session.query(NotificationRecordDB).get(record.id)
             return NotificationRecord(**refreshed.to_dict()) if refreshed else record
 
-    async def process_pending_notifications(self):
-        """Process pending notifications scheduled for now or past (CAS防重)"""
-        self._ensure_initialized()
-        
+    def _claim_pending_notifications(self) -> Tuple[List[NotificationRecord], Dict[str, DeviceDB]]:
+        """领取到期的待发送通知，并批量读取其目标设备（同步，供线程池调用）
+
+        Returns:
+            (本 Worker 成功领取的通知列表, device_id → 设备)
+        """
         # 1. 原子性地将 PENDING → PROCESSING，防止多 Worker 重复拿取
-        claimed_ids = []
         with self.get_session() as session:
             now = datetime.utcnow()
             # 先查询符合条件的记录 ID
@@ -561,7 +592,7 @@ class NotificationService:
             candidate_ids = [r[0] for r in rows]
             
             if not candidate_ids:
-                return
+                return [], {}
             
             # 原子更新: 仅更新仍然是 PENDING 的记录为 PROCESSING
             updated = session.query(NotificationRecordDB).filter(
@@ -574,20 +605,19 @@ class NotificationService:
             session.commit()
             
             if updated == 0:
-                return
+                return [], {}
             
             # 重新拉取被本 Worker 成功锁定的记录
             claimed_rows = session.query(NotificationRecordDB).filter(
                 NotificationRecordDB.id.in_(candidate_ids),
                 NotificationRecordDB.status == "processing"
             ).all()
-            claimed_ids = [r.id for r in claimed_rows]
             pending_records = [NotificationRecord(**r.to_dict()) for r in claimed_rows]
             
         if not pending_records:
-            return
+            return [], {}
             
-        print(f"[Notification] Processing {len(pending_records)} pending notifications (CAS claimed)")
+        logger.info("Processing %d pending notifications (CAS claimed)", len(pending_records))
         
         # 2. 批量获取所有相关设备，避免 N+1 查询
         device_ids = list(set(r.device_id for r in pending_records if r.device_id))
@@ -602,27 +632,34 @@ class NotificationService:
                     device_map[d.id] = d
                 # 保持 session 打开以便后续使用
                 session.expunge_all()
-        
-        # 3. 逐条发送
+
+        return pending_records, device_map
+
+    async def process_pending_notifications(self):
+        """Process pending notifications scheduled for now or past (CAS防重)"""
+        self._ensure_initialized()
+
+        # 领取与设备查询都是同步 SQLite 操作，放到线程里执行，不阻塞事件循环
+        pending_records, device_map = await asyncio.to_thread(self._claim_pending_notifications)
+        if not pending_records:
+            return
+
+        # 3. 找不到设备的直接标记失败，其余并发发送
+        to_send = []
         for record in pending_records:
-            try:
-                device = device_map.get(record.device_id) if record.device_id else None
-                
-                if device:
-                    print(f"[Notification] Sending pending notification {record.id} to device {device.id}")
-                    await self._send_to_device(record, device)
-                else:
-                    print(f"[Notification] Device {record.device_id} not found for pending notification {record.id}")
-                    record.status = NotificationStatus.FAILED
-                    record.error_message = "Target device not found"
-                    self._save_record(record)
-                    
-            except Exception as e:
-                print(f"[Notification] Error processing pending record {record.id}: {e}")
+            device = device_map.get(record.device_id) if record.device_id else None
+            if device:
+                logger.debug("Sending pending notification %s to device %s", record.id, device.id)
+                to_send.append((record, device))
+            else:
+                logger.warning("Device %s not found for pending notification %s", record.device_id, record.id)
                 record.status = NotificationStatus.FAILED
-                record.error_message = str(e)
+                record.error_message = "Target device not found"
                 self._save_record(record)
 
+        if to_send:
+            await self._send_batch(to_send)
+
     def get_notification_history(
         self,
         user_id: str,
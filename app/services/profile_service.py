@@ -4,12 +4,13 @@ User Profile Service - 用户画像服务 (简化版)
 """
 from typing import Dict, Any, List, Optional
 from datetime import datetime
-from sqlalchemy import create_engine, text
+from sqlalchemy import bindparam, create_engine, text
 from sqlalchemy.pool import StaticPool
 from sqlalchemy.orm import sessionmaker, Session
 
 from app.models.user_profile import UserProfile
 from app.config import settings
+from app.services.db import apply_sqlite_pragmas
 
 
 class UserProfileService:
@@ -25,6 +26,7 @@ class UserProfileService:
             poolclass=StaticPool,
             echo=False
         )
+        apply_sqlite_pragmas(self.engine)
 
         self.SessionLocal = sessionmaker(
             autocommit=False,
@@ -83,6 +85,37 @@ class UserProfileService:
         finally:
             db.close()
 
+    def get_profiles_bulk(self, user_ids: List[str]) -> Dict[str, UserProfile]:
+        """批量读取用户画像（一次 IN 查询）
+
+        供调度器等只读场景使用：不存在的用户返回默认画像，但不会写入数据库。
+        """
+        ids = list({uid for uid in user_ids if uid})
+        if not ids:
+            return {}
+
+        import json
+        profiles: Dict[str, UserProfile] = {}
+        db = self.get_session()
+        try:
+            rows = db.execute(
+                text("""SELECT user_id, profile_data FROM user_profiles WHERE user_id IN :user_ids""")
+                .bindparams(bindparam("user_ids", expanding=True)),
+                {"user_ids": ids}
+            ).fetchall()
+            for row in rows:
+                profiles[row[0]] = UserProfile.from_dict(json.loads(row[1]))
+        except Exception as e:
+            if not ("no such table" in str(e) or "user_profiles" in str(e)):
+                raise e
+        finally:
+            db.close()
+
+        for uid in ids:
+            if uid not in profiles:
+                profiles[uid] = UserProfile(user_id=uid)
+        return profiles
+
     def save_profile(self, user_id: str, profile: UserProfile) -> bool:
         """保存用户画像"""
         db = self.get_session()
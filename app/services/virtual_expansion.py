@@ -11,6 +11,9 @@ from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 from pytz import timezone
 import calendar
+import logging
+
+logger = logging.getLogger("virtual_expansion")
 
 
 class VirtualExpansionService:
@@ -59,7 +62,7 @@ class VirtualExpansionService:
                         date_key = date_str
                 real_lookup[(template_id, date_key)] = True
 
-        print(f"🔍 Real lookup: {len(real_lookup)} entries for {len(real_instances)} instances")
+        logger.debug("Real lookup: %d entries for %d instances", len(real_lookup), len(real_instances))
 
         for template in templates:
             pattern = template.get("repeat_pattern")
@@ -80,7 +83,7 @@ class VirtualExpansionService:
 
                 # Skip if real instance exists
                 if real_lookup.get((template_id, date_key)):
-                    print(f"⏭️ Skipping virtual for {template_id} on {date_key}")
+                    logger.debug("Skipping virtual for %s on %s", template_id, date_key)
                     continue
 
                 # Create virtual instance
@@ -5,6 +5,7 @@ Awake Window Checker - 清醒窗口检查器
 决定是否应该发送通知。
 """
 from datetime import datetime, time
+from functools import lru_cache
 from typing import Optional
 
 
@@ -148,9 +149,21 @@ class AwakeWindowChecker:
         return ritual_time
 
 
+@lru_cache(maxsize=4096)
+def _checker_for(wake_time: str, sleep_time: str) -> AwakeWindowChecker:
+    """
+    按 (起床时间, 睡觉时间) 缓存检查器实例
+
+    检查器创建后只读，作息相同的用户共用同一个实例，
+    批量推送时不必每个用户都重新构造、重新解析时间。
+    作息变更后 key 随之变化，无需手动失效。
+    """
+    return AwakeWindowChecker(wake_time=wake_time, sleep_time=sleep_time)
+
+
 def get_user_awake_checker(preferences: dict) -> AwakeWindowChecker:
     """
-    从用户偏好字典创建清醒窗口检查器
+    从用户偏好字典获取清醒窗口检查器（按作息缓存，见 _checker_for）
     
     Args:
         preferences: UserProfile.preferences 字典
@@ -158,7 +171,7 @@ def get_user_awake_checker(preferences: dict) -> AwakeWindowChecker:
     Returns:
         配置好的 AwakeWindowChecker 实例
     """
-    return AwakeWindowChecker(
-        wake_time=preferences.get("wake_time", "08:00"),
-        sleep_time=preferences.get("sleep_time", "22:00")
+    return _checker_for(
+        preferences.get("wake_time", "08:00"),
+        preferences.get("sleep_time", "22:00")
     )
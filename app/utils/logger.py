@@ -3,7 +3,10 @@ UniLife Logging System - 统一日志系统
 
 提供详细的日志追踪，方便调试 LLM 行为
 """
+import atexit
 import logging
+import logging.handlers
+import queue
 import sys
 import json
 import time
@@ -366,6 +369,9 @@ def setup_logging(
         file_handler.setFormatter(UniLifeFormatter(use_color=False, show_detail=True))
         root_logger.addHandler(file_handler)
 
+    # 把实际的 stdout/文件写入交给后台线程，业务协程只负责入队
+    enable_queue_logging()
+
     # 设置第三方库的日志级别
     logging.getLogger("httpx").setLevel(logging.WARNING)
     logging.getLogger("httpcore").setLevel(logging.WARNING)
@@ -378,6 +384,52 @@ def setup_logging(
         root_logger.info(f"  Log File: {log_file}")
 
 
+# 后台日志线程（QueueListener），全局唯一
+_queue_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def enable_queue_logging():
+    """
+    将根日志记录器的处理器替换为 QueueHandler + QueueListener
+
+    日志记录只在调用方线程里入队，格式化和 I/O 在监听线程中完成，
+    避免调度器协程在高频日志时被 stdout/文件写入阻塞。
+    可重复调用：处理器已被接管时直接返回；之后新加的处理器会与旧监听线程的处理器一起接管。
+    """
+    global _queue_listener
+
+    root_logger = logging.getLogger()
+    queue_attached = any(isinstance(h, logging.handlers.QueueHandler) for h in root_logger.handlers)
+    handlers = [h for h in root_logger.handlers if not isinstance(h, logging.handlers.QueueHandler)]
+
+    if not handlers:
+        # 重复调用：现有处理器已由监听线程接管（或根本没有处理器），保持不变
+        return
+
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        if queue_attached:
+            # 旧的 QueueHandler 仍挂在根记录器上，它背后的处理器需要继续保留
+            handlers = list(_queue_listener.handlers) + handlers
+        _queue_listener = None
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    root_logger.handlers.clear()
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    _queue_listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _queue_listener.start()
+
+
+@atexit.register
+def _stop_queue_logging():
+    """进程退出时刷新并停止后台日志线程"""
+    global _queue_listener
+    if _queue_listener is not None:
+        _queue_listener.stop()
+        _queue_listener = None
+
+
 # 初始化日志系统
 def init_logging():
     """根据配置初始化日志"""
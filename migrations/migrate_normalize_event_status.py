@@ -0,0 +1,30 @@
+"""Normalize events.status to the canonical upper-case EventStatus values
+
+The application only writes EventStatus values ("PENDING", "IN_PROGRESS", ...),
+but older rows may carry lower-case variants. Once normalized, the scheduler
+can filter on the canonical values alone.
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from app.config import settings
+
+def migrate():
+    engine = create_engine(settings.database_url)
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            result = conn.execute(text(
+                "UPDATE events SET status = UPPER(status) WHERE status <> UPPER(status)"
+            ))
+            trans.commit()
+            print(f"✅ Normalized status on {result.rowcount} events")
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            trans.rollback()
+            raise
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,470 @@
+"""
+Tests for BackgroundTaskScheduler helpers.
+
+These tests cover the pure/in-memory logic of the scheduler and stub out
+database access, so they don't need a populated SQLite file.
+"""
+import asyncio
+from datetime import date, datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from sqlalchemy.dialects import sqlite
+
+from app.scheduler.background_tasks import BackgroundTaskScheduler, EventReminder, _day_bounds
+from app.services.db import EventModel
+
+
+class TestDayBounds:
+    """_day_bounds should return a half-open UTC range for a Shanghai local day"""
+
+    def test_half_open_utc_range(self):
+        assert _day_bounds(date(2026, 2, 8)) == ("2026-02-07 16:00:00", "2026-02-08 16:00:00")
+
+    def test_consecutive_days_share_boundary(self):
+        assert _day_bounds(date(2026, 2, 8))[1] == _day_bounds(date(2026, 2, 9))[0]
+
+
+class TestParseStartTime:
+    """_parse_start_time should return naive Asia/Shanghai datetimes for all stored formats"""
+
+    @pytest.mark.parametrize("raw, expected", [
+        ("2026-02-08 15:30:00.000000", datetime(2026, 2, 8, 15, 30)),
+        ("2026-02-08 15:30:00.5", datetime(2026, 2, 8, 15, 30, 0, 500000)),
+        ("2026-02-08 15:30:00", datetime(2026, 2, 8, 15, 30)),
+        ("2026-02-08 15:30", datetime(2026, 2, 8, 15, 30)),
+        ("2026-02-08T15:30:00", datetime(2026, 2, 8, 15, 30)),
+        ("2026-02-08T07:30:00Z", datetime(2026, 2, 8, 15, 30)),
+        ("2026-02-08T15:30:00+08:00", datetime(2026, 2, 8, 15, 30)),
+        ("2026-02-08T02:30:00-05:00", datetime(2026, 2, 8, 15, 30)),
+        ("2026-02-08 07:30:00.250000+00:00", datetime(2026, 2, 8, 15, 30, 0, 250000)),
+    ])
+    def test_formats(self, raw, expected):
+        assert BackgroundTaskScheduler()._parse_start_time(raw) == expected
+
+    def test_invalid(self):
+        scheduler = BackgroundTaskScheduler()
+        assert scheduler._parse_start_time("not a time") is None
+        assert scheduler._parse_start_time("2026-02-30 10:00:00") is None
+        assert scheduler._parse_start_time(None) is None
+
+
+class TestReminderWindowFormat:
+    """The reminder query compares start_time as strings, so the stored format must sort like time"""
+
+    def test_orm_stores_space_separated_naive_format(self):
+        dialect = sqlite.dialect()
+        bind = EventModel.__table__.c.start_time.type.dialect_impl(dialect).bind_processor(dialect)
+        stored = bind(datetime(2026, 2, 8, 15, 30))
+
+        assert stored == "2026-02-08 15:30:00.000000"
+        # the window bounds built by _collect_event_reminders use the same prefix
+        assert "2026-02-08 15:29:00" < stored < "2026-02-08 15:31:00"
+
+
+class TestActiveUsersForDateCache:
+    """_get_active_users_for_date should hit the DB once per target_date"""
+
+    def test_second_call_uses_cache(self):
+        scheduler = BackgroundTaskScheduler()
+        target = date(2026, 2, 8)
+
+        with patch.object(scheduler, "_query_active_users_for_date", return_value=["u1", "u2"]) as query:
+            assert scheduler._get_active_users_for_date(target) == ["u1", "u2"]
+            assert scheduler._get_active_users_for_date(target) == ["u1", "u2"]
+
+        query.assert_called_once_with(target)
+
+    def test_different_dates_are_cached_separately(self):
+        scheduler = BackgroundTaskScheduler()
+
+        with patch.object(scheduler, "_query_active_users_for_date", side_effect=[["u1"], ["u2"]]) as query:
+            assert scheduler._get_active_users_for_date(date(2026, 2, 8)) == ["u1"]
+            assert scheduler._get_active_users_for_date(date(2026, 2, 9)) == ["u2"]
+
+        assert query.call_count == 2
+
+    def test_stop_clears_cache(self):
+        scheduler = BackgroundTaskScheduler()
+        target = date(2026, 2, 8)
+
+        with patch.object(scheduler, "_query_active_users_for_date", return_value=["u1"]) as query:
+            scheduler._get_active_users_for_date(target)
+            scheduler.stop()
+            scheduler._get_active_users_for_date(target)
+
+        assert query.call_count == 2
+
+
+class TestAllActiveUsersCache:
+    """_get_all_active_users should reuse the list within ACTIVE_USERS_TTL"""
+
+    def test_second_call_uses_cache(self):
+        scheduler = BackgroundTaskScheduler()
+
+        with patch.object(scheduler, "_query_all_active_users", return_value=["u1"]) as query:
+            assert scheduler._get_all_active_users() == ["u1"]
+            assert scheduler._get_all_active_users() == ["u1"]
+
+        query.assert_called_once()
+
+    def test_empty_result_is_not_cached(self):
+        scheduler = BackgroundTaskScheduler()
+
+        with patch.object(scheduler, "_query_all_active_users", return_value=[]) as query:
+            scheduler._get_all_active_users()
+            scheduler._get_all_active_users()
+
+        assert query.call_count == 2
+
+
+class TestIoPool:
+    """Blocking DB helpers run on the scheduler's dedicated thread pool"""
+
+    @pytest.mark.asyncio
+    async def test_run_io_without_pool_falls_back_to_thread(self):
+        scheduler = BackgroundTaskScheduler()
+        assert scheduler._io_pool is None
+
+        assert await scheduler._run_io(lambda a, b: a + b, 1, 2) == 3
+
+    @pytest.mark.asyncio
+    async def test_run_io_uses_pool(self):
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+
+        scheduler = BackgroundTaskScheduler()
+        scheduler._io_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sched-db")
+        try:
+            name = await scheduler._run_io(lambda: threading.current_thread().name)
+        finally:
+            scheduler.stop()
+
+        assert name.startswith("sched-db")
+        assert scheduler._io_pool is None
+
+
+class TestWeeklyConsolidation:
+    """_consolidate_memories resumes from the per-user checkpoint"""
+
+    @pytest.mark.asyncio
+    async def test_resumes_after_checkpoint(self):
+        scheduler = BackgroundTaskScheduler()
+
+        with patch.object(scheduler, "_get_all_active_users", return_value=["done", "todo"]), \
+                patch("app.scheduler.background_tasks.get_consolidated_users", return_value={"done"}), \
+                patch("app.scheduler.background_tasks.mark_consolidated") as mark, \
+                patch("app.scheduler.background_tasks.observer_agent") as observer:
+            observer.consolidate_memory = AsyncMock(return_value=None)
+            await scheduler._consolidate_memories()
+
+        observer.consolidate_memory.assert_awaited_once_with("todo")
+        mark.assert_called_once_with("todo")
+
+
+class TestDailyReviewConcurrency:
+    """_daily_review reviews users concurrently, capped at DAILY_REVIEW_CONCURRENCY"""
+
+    @pytest.mark.asyncio
+    async def test_reviews_are_bounded(self):
+        scheduler = BackgroundTaskScheduler()
+        scheduler.DAILY_REVIEW_CONCURRENCY = 2
+        in_flight = 0
+        peak = 0
+
+        async def fake_review(user_id, date_str):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            if user_id == "u3":
+                raise RuntimeError("llm down")
+
+        with patch.object(scheduler, "_get_active_users_for_date", return_value=["u1", "u2", "u3", "u4"]), \
+                patch("app.scheduler.background_tasks.purge_scheduler_locks", return_value=0), \
+                patch("app.scheduler.background_tasks.purge_sent_reminders", return_value=0), \
+                patch("app.scheduler.background_tasks.observer_agent") as observer:
+            observer.daily_review = AsyncMock(side_effect=fake_review)
+            await scheduler._daily_review()
+
+        assert observer.daily_review.await_count == 4
+        assert peak == 2
+
+
+class TestJobStatusSnapshot:
+    """get_job_status should reuse the serialized job list within JOB_STATUS_TTL"""
+
+    def test_snapshot_reused_within_ttl(self):
+        scheduler = BackgroundTaskScheduler()
+        scheduler.scheduler = MagicMock(running=True)
+        scheduler.scheduler.get_jobs.return_value = [MagicMock(id="j1", next_run_time=None)]
+
+        first = scheduler.get_job_status()
+        second = scheduler.get_job_status()
+
+        assert first == second
+        assert first["jobs"][0]["id"] == "j1"
+        scheduler.scheduler.get_jobs.assert_called_once()
+
+    def test_snapshot_refreshed_after_ttl(self):
+        scheduler = BackgroundTaskScheduler()
+        scheduler.JOB_STATUS_TTL = 0
+        scheduler.scheduler = MagicMock(running=True)
+        scheduler.scheduler.get_jobs.return_value = []
+
+        scheduler.get_job_status()
+        scheduler.get_job_status()
+
+        assert scheduler.scheduler.get_jobs.call_count == 2
+
+
+class TestMinutelyTick:
+    """_minutely_tick should run all three per-minute sub-tasks even if one fails"""
+
+    @pytest.mark.asyncio
+    async def test_runs_all_subtasks(self):
+        scheduler = BackgroundTaskScheduler()
+
+        with patch.object(scheduler, "_check_and_send_notifications", AsyncMock(side_effect=RuntimeError)) as check, \
+             patch.object(scheduler, "_process_pending_notifications", AsyncMock()) as pending, \
+             patch.object(scheduler, "_check_event_reminders", AsyncMock()) as reminders:
+            await scheduler._minutely_tick()
+
+        check.assert_awaited_once()
+        pending.assert_awaited_once()
+        reminders.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_subtasks_share_tick_time(self):
+        scheduler = BackgroundTaskScheduler()
+
+        with patch.object(scheduler, "_check_and_send_notifications", AsyncMock()) as check, \
+             patch.object(scheduler, "_process_pending_notifications", AsyncMock()) as pending, \
+             patch.object(scheduler, "_check_event_reminders", AsyncMock()) as reminders:
+            await scheduler._minutely_tick()
+
+        tick_time = check.await_args.args[0]
+        assert tick_time.tzinfo is not None
+        assert pending.await_args.args[0] is tick_time
+        assert reminders.await_args.args[0] is tick_time
+
+
+class TestUserNotificationConcurrency:
+    """Proactive checks should run as background tasks, bounded by the semaphore"""
+
+    @pytest.mark.asyncio
+    async def test_concurrency_is_capped(self):
+        import asyncio
+
+        scheduler = BackgroundTaskScheduler()
+        scheduler._user_check_semaphore = asyncio.Semaphore(2)
+        running = 0
+        peak = 0
+
+        async def fake_run_check(user_id, check_type):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        with patch("app.scheduler.background_tasks.proactive_check_agent") as agent:
+            agent.run_check = AsyncMock(side_effect=fake_run_check)
+            for user_id in ["u1", "u2", "u3", "u4", "u5"]:
+                scheduler._schedule_background(scheduler._run_proactive_check(user_id, "noon"))
+            await asyncio.gather(*scheduler._background_tasks)
+
+        assert agent.run_check.await_count == 5
+        assert peak == 2
+        assert not scheduler._background_tasks
+
+
+class TestNotificationSchedule:
+    """The minute-of-day trigger table should map each active user's check points"""
+
+    def _build(self, scheduler, preferences):
+        from app.models.user_profile import UserProfile
+
+        profile = UserProfile(user_id="apple-1")
+        profile.preferences.update(preferences)
+        with patch.object(scheduler, "_get_all_active_users", return_value=["u1"]), \
+             patch("app.scheduler.background_tasks.get_apple_ids", return_value={"u1": "apple-1"}), \
+             patch("app.services.profile_service.profile_service.get_profiles_bulk",
+                   return_value={"apple-1": profile}):
+            return scheduler._build_notification_schedule()
+
+    def test_builds_four_check_points(self):
+        scheduler = BackgroundTaskScheduler()
+
+        schedule = self._build(scheduler, {"wake_time": "07:30", "sleep_time": "23:00"})
+
+        assert schedule == {
+            7 * 60 + 30: [("u1", "morning")],
+            12 * 60: [("u1", "noon")],
+            18 * 60: [("u1", "evening")],
+            22 * 60 + 45: [("u1", "night")],
+        }
+
+    def test_unpadded_and_invalid_times(self):
+        scheduler = BackgroundTaskScheduler()
+
+        schedule = self._build(scheduler, {"wake_time": "7:05", "sleep_time": "bedtime"})
+
+        assert schedule == {
+            7 * 60 + 5: [("u1", "morning")],
+            12 * 60: [("u1", "noon")],
+            18 * 60: [("u1", "evening")],
+        }
+
+    def test_ritual_wraps_past_midnight(self):
+        scheduler = BackgroundTaskScheduler()
+
+        schedule = self._build(scheduler, {"sleep_time": "00:10"})
+
+        assert schedule[23 * 60 + 55] == [("u1", "night")]
+
+    def test_schedule_is_cached_until_invalidated(self):
+        scheduler = BackgroundTaskScheduler()
+
+        with patch.object(scheduler, "_build_notification_schedule", return_value={}) as build, \
+             patch("app.scheduler.background_tasks.get_profiles_version", return_value="v1"):
+            scheduler._get_notification_schedule()
+            scheduler._get_notification_schedule()
+            scheduler.invalidate_notification_schedule()
+            scheduler._get_notification_schedule()
+
+        assert build.call_count == 2
+
+    def test_schedule_rebuilt_when_profiles_change(self):
+        scheduler = BackgroundTaskScheduler()
+
+        with patch.object(scheduler, "_build_notification_schedule", return_value={}) as build, \
+             patch("app.scheduler.background_tasks.get_profiles_version",
+                   side_effect=["v1", "v1", "v2"]):
+            scheduler._get_notification_schedule()
+            scheduler._get_notification_schedule()
+            # another process saved a profile: the version stamp moves on
+            scheduler._get_notification_schedule()
+
+        assert build.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_only_due_users_are_checked(self):
+        scheduler = BackgroundTaskScheduler()
+        schedule = MagicMock()
+        schedule.get.return_value = [("u1", "noon"), ("u2", "noon")]
+
+        with patch.object(scheduler, "_get_notification_schedule", return_value=schedule), \
+             patch.object(scheduler, "_check_user_notifications", AsyncMock()) as check:
+            await scheduler._check_and_send_notifications()
+
+        assert check.await_count == 2
+        assert {call.args[:2] for call in check.await_args_list} == {("u1", "noon"), ("u2", "noon")}
+
+    @pytest.mark.asyncio
+    async def test_same_minute_is_checked_once(self):
+        scheduler = BackgroundTaskScheduler()
+        tick = datetime(2024, 1, 15, 12, 0, 0)
+
+        with patch.object(scheduler, "_get_notification_schedule",
+                          return_value={12 * 60: [("u1", "noon")]}) as get_schedule, \
+             patch.object(scheduler, "_check_user_notifications", AsyncMock()) as check:
+            await scheduler._check_and_send_notifications(tick)
+            await scheduler._check_and_send_notifications(tick.replace(second=59))
+
+        assert get_schedule.call_count == 1
+        assert check.await_count == 1
+
+
+class TestSendEventReminder:
+    """_send_event_reminder should wait for delay_seconds before generating the reminder"""
+
+    @pytest.mark.asyncio
+    async def test_waits_until_due(self):
+        scheduler = BackgroundTaskScheduler()
+        event = EventReminder(event_id="e1", user_id="u1", title="Standup",
+                              reminder_minutes=15, minutes_until=15, delay_seconds=12.5,
+                              event_time="209901011200")
+        calls = []
+
+        with patch("app.scheduler.background_tasks.asyncio.sleep",
+                   AsyncMock(side_effect=lambda _: calls.append("sleep"))) as sleep, \
+             patch("app.scheduler.background_tasks.mark_reminder_sent",
+                   side_effect=lambda *args: calls.append("claim") or True) as claim, \
+             patch("app.agents.notification_agent.notification_agent.generate_event_reminder",
+                   AsyncMock()) as generate:
+            await scheduler._send_event_reminder(event)
+
+        sleep.assert_awaited_once_with(12.5)
+        # the reminder is only claimed once the wait is over
+        claim.assert_called_once_with("u1", "e1", "209901011200")
+        assert calls == ["sleep", "claim"]
+        generate.assert_awaited_once()
+        assert generate.await_args.kwargs["minutes_until"] == 15
+
+    @pytest.mark.asyncio
+    async def test_skips_when_claimed_elsewhere(self):
+        scheduler = BackgroundTaskScheduler()
+        event = EventReminder("e1", "u1", "Standup", 15, 15, 12.5, "209901011200")
+
+        with patch("app.scheduler.background_tasks.asyncio.sleep", AsyncMock()), \
+             patch("app.scheduler.background_tasks.mark_reminder_sent", return_value=False), \
+             patch("app.agents.notification_agent.notification_agent.generate_event_reminder",
+                   AsyncMock()) as generate:
+            await scheduler._send_event_reminder(event)
+
+        generate.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_sends_are_bounded(self):
+        scheduler = BackgroundTaskScheduler()
+        scheduler._event_reminder_semaphore = asyncio.Semaphore(2)
+        in_flight = 0
+        peak = 0
+
+        async def fake_generate(**kwargs):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+
+        events = [EventReminder(f"e{i}", "u1", "t", 15, 15, 0.0) for i in range(5)]
+        with patch("app.agents.notification_agent.notification_agent.generate_event_reminder",
+                   AsyncMock(side_effect=fake_generate)) as generate:
+            await asyncio.gather(*(scheduler._send_event_reminder(e) for e in events))
+
+        assert generate.await_count == 5
+        assert peak == 2
+
+
+class TestCheckEventReminders:
+    """_check_event_reminders sends due reminders concurrently and defers the rest"""
+
+    @pytest.mark.asyncio
+    async def test_due_reminders_sent_concurrently(self):
+        scheduler = BackgroundTaskScheduler()
+        events = [EventReminder(f"e{i}", "u1", "t", 15, 15, delay)
+                  for i, delay in enumerate([0.0, 0.0, 30.0])]
+        in_flight = 0
+        peak = 0
+        sent = []
+
+        async def fake_send(event):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0)
+            in_flight -= 1
+            sent.append(event.event_id)
+
+        with patch.object(scheduler, "_collect_event_reminders", return_value=events), \
+                patch.object(scheduler, "_send_event_reminder", side_effect=fake_send), \
+                patch.object(scheduler, "_schedule_background",
+                             side_effect=lambda coro: coro.close()) as schedule_background:
+            await scheduler._check_event_reminders()
+
+        assert sorted(sent) == ["e0", "e1"]
+        assert peak == 2
+        schedule_background.assert_called_once()
@@ -0,0 +1,111 @@
+"""
+Tests for DailyNotificationScheduler.
+"""
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.scheduler.daily_notifications import DailyNotificationScheduler, SHANGHAI_TZ
+
+
+class TestSendForPeriod:
+    """send_for_period should route each node type to its sender"""
+
+    @pytest.mark.asyncio
+    async def test_routes_to_sender(self):
+        scheduler = DailyNotificationScheduler()
+
+        with patch.object(scheduler, "send_evening_switch", AsyncMock(return_value=True)) as send:
+            assert await scheduler.send_for_period("u1", "evening_switch", force=True) is True
+
+        send.assert_awaited_once_with("u1", force=True)
+
+    @pytest.mark.asyncio
+    async def test_unknown_period_rejected(self):
+        scheduler = DailyNotificationScheduler()
+
+        with pytest.raises(ValueError):
+            await scheduler.send_for_period("u1", "brunch")
+
+
+class TestPartitionByPeriod:
+    """_partition_by_period should bucket a day's events in one pass"""
+
+    def test_buckets_by_hour_and_time_period(self):
+        scheduler = DailyNotificationScheduler()
+        events = [
+            {"title": "late", "start_time": "2024-01-15 19:30:00"},
+            {"title": "standup", "start_time": "2024-01-15 09:00:00"},
+            {"title": "lunch", "start_time": "2024-01-15T12:30:00Z"},
+            {"title": "early", "start_time": "2024-01-15 05:00:00"},
+            {"title": "read", "time_period": "night"},
+            {"title": "gym", "time_period": "AFTERNOON"},
+            {"title": "chores", "time_period": "anytime"},
+            {"title": "laundry", "time_period": "ANYTIME"},
+            {"title": "broken", "start_time": "soon"},
+        ]
+
+        buckets = scheduler._partition_by_period(events)
+
+        assert [e["title"] for e in buckets["morning"]] == ["standup"]
+        assert [e["title"] for e in buckets["afternoon"]] == ["gym", "lunch"]
+        assert [e["title"] for e in buckets["evening"]] == ["read", "late"]
+        assert [e["title"] for e in buckets["anytime"]] == ["chores", "laundry"]
+
+
+class TestIsUrgent:
+    """_is_urgent should judge deadlines against the given tick_time"""
+
+    def test_deadline_relative_to_tick_time(self):
+        scheduler = DailyNotificationScheduler()
+        tick = SHANGHAI_TZ.localize(datetime(2024, 1, 15, 21, 0))
+        task = {"deadline": "2024-01-16 20:00:00"}
+
+        assert scheduler._is_urgent(task, tick_time=tick) is True
+        assert scheduler._is_urgent(task, tick_time=tick - timedelta(days=1)) is False
+        assert scheduler._is_urgent({"deadline": "2024-01-16T12:00:00Z"}, tick_time=tick) is True
+
+
+class TestGenerateAndDispatch:
+    """_generate_and_dispatch should report should_send and swallow agent failures"""
+
+    @pytest.mark.asyncio
+    async def test_returns_should_send(self):
+        scheduler = DailyNotificationScheduler()
+
+        with patch("app.scheduler.daily_notifications.notification_agent.generate_periodic_notification",
+                   AsyncMock(return_value={"should_send": True})) as generate:
+            sent = await scheduler._generate_and_dispatch("u1", "night", "Closing ritual", [], "")
+
+        assert sent is True
+        generate.assert_awaited_once_with(user_id="u1", period="night", events=[], recent_context="")
+
+    @pytest.mark.asyncio
+    async def test_agent_failure_returns_false(self):
+        scheduler = DailyNotificationScheduler()
+
+        with patch("app.scheduler.daily_notifications.notification_agent.generate_periodic_notification",
+                   AsyncMock(side_effect=RuntimeError("boom"))):
+            assert await scheduler._generate_and_dispatch("u1", "night", "Closing ritual", [], "") is False
+
+
+class TestEventCache:
+    """Events are memoized per (user, date) until cleared"""
+
+    @pytest.mark.asyncio
+    async def test_memoized_until_cleared(self):
+        scheduler = DailyNotificationScheduler()
+        db = AsyncMock()
+        db.get_events_for_date.return_value = [{"title": "Standup"}]
+        scheduler.db_service = db
+
+        await scheduler._get_today_events("u1")
+        await scheduler._get_today_events("u1")
+        await scheduler._get_tomorrow_events("u1")
+        await scheduler._get_tomorrow_events("u1")
+        assert db.get_events_for_date.await_count == 2
+
+        scheduler.clear_event_cache("u1")
+        await scheduler._get_today_events("u1")
+        assert db.get_events_for_date.await_count == 3
@@ -0,0 +1,65 @@
+"""
+Tests for NotificationAgent periodic decision caching.
+"""
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.agents.notification_agent import NotificationAgent
+
+CHECKLIST = {
+    "agent_name": "UniLife",
+    "agent_emoji": "🤖",
+    "agent_vibe": "友好",
+    "soul_content": "soul v1",
+    "memory_content": "memory v1",
+}
+
+
+class TestPeriodicCache:
+    """Re-running the same node with unchanged inputs should reuse the LLM decision but still send"""
+
+    @pytest.mark.asyncio
+    async def test_rerun_reuses_decision(self):
+        agent = NotificationAgent()
+        decision = {"should_send": True, "title": "早安", "body": "今天有 1 个日程"}
+        events = [{"title": "Standup", "start_time": "2024-01-15 09:00:00"}]
+
+        with patch.object(agent, "_load_periodic_checklist", return_value=CHECKLIST), \
+             patch.object(agent, "_decide_periodic_notification", AsyncMock(return_value=decision)) as decide, \
+             patch.object(agent, "_send_and_inject", AsyncMock()) as send:
+            await agent.generate_periodic_notification("u1", "morning", events, "ctx")
+            await agent.generate_periodic_notification("u1", "morning", events, "ctx")
+
+        assert decide.await_count == 1
+        assert send.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_changed_inputs_miss_cache(self):
+        agent = NotificationAgent()
+        decision = {"should_send": False}
+
+        with patch.object(agent, "_load_periodic_checklist", return_value=CHECKLIST), \
+             patch.object(agent, "_decide_periodic_notification", AsyncMock(return_value=decision)) as decide:
+            await agent.generate_periodic_notification("u1", "morning", [], "ctx")
+            await agent.generate_periodic_notification("u1", "evening", [], "ctx")
+            await agent.generate_periodic_notification("u1", "evening", [], "new ctx")
+
+        assert decide.await_count == 3
+
+    @pytest.mark.asyncio
+    async def test_soul_or_memory_change_misses_cache(self):
+        agent = NotificationAgent()
+        decision = {"should_send": False}
+        checklists = [
+            CHECKLIST,
+            {**CHECKLIST, "soul_content": "soul v2"},
+            {**CHECKLIST, "soul_content": "soul v2", "memory_content": "memory v2"},
+        ]
+
+        with patch.object(agent, "_load_periodic_checklist", side_effect=checklists), \
+             patch.object(agent, "_decide_periodic_notification", AsyncMock(return_value=decision)) as decide:
+            for _ in checklists:
+                await agent.generate_periodic_notification("u1", "morning", [], "ctx")
+
+        assert decide.await_count == 3
@@ -0,0 +1,44 @@
+"""
+Tests for NotificationService batch sending.
+"""
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.models.notification import (
+    NotificationPayload, NotificationPlatform, NotificationRecord, NotificationStatus, NotificationType
+)
+from app.services.notification_service import NotificationService
+
+
+def _record(user_id: str) -> NotificationRecord:
+    return NotificationRecord(
+        user_id=user_id,
+        platform=NotificationPlatform.APNS,
+        type=NotificationType.EVENT_REMINDER,
+        payload=NotificationPayload(title="t", body="b"),
+    )
+
+
+class TestSendBatch:
+    """_send_batch should send concurrently and isolate per-item failures"""
+
+    @pytest.mark.asyncio
+    async def test_failure_does_not_affect_other_items(self):
+        service = NotificationService()
+        ok, bad = _record("u1"), _record("u2")
+
+        async def fake_send(record, device):
+            if record is bad:
+                raise RuntimeError("boom")
+            record.status = NotificationStatus.SENT
+            return record
+
+        with patch.object(service, "_send_to_device", side_effect=fake_send), \
+             patch.object(service, "_save_record", side_effect=lambda r: r):
+            results = await service._send_batch([(ok, MagicMock()), (bad, MagicMock())])
+
+        assert [r.user_id for r in results] == ["u1", "u2"]
+        assert results[0].status == NotificationStatus.SENT
+        assert results[1].status == NotificationStatus.FAILED
+        assert results[1].error_message == "boom"
@@ -0,0 +1,34 @@
+"""
+Tests for UserProfileService bulk profile lookup.
+"""
+from app.models.user_profile import UserProfile
+from app.services.profile_service import UserProfileService
+
+
+class TestGetProfilesBulk:
+    """get_profiles_bulk should load stored profiles in one call without creating missing ones"""
+
+    def test_returns_stored_and_default_profiles(self, tmp_path):
+        service = UserProfileService(db_path=str(tmp_path / "profiles.db"))
+        stored = UserProfile(user_id="u1")
+        stored.preferences["event_reminder_minutes"] = 30
+        service.save_profile("u1", stored)
+
+        profiles = service.get_profiles_bulk(["u1", "u2", "u1", None])
+
+        assert set(profiles) == {"u1", "u2"}
+        assert profiles["u1"].preferences["event_reminder_minutes"] == 30
+        assert profiles["u2"].preferences["event_reminder_minutes"] == 15
+
+    def test_missing_profiles_are_not_persisted(self, tmp_path):
+        service = UserProfileService(db_path=str(tmp_path / "profiles.db"))
+
+        service.get_profiles_bulk(["u3"])
+
+        with service.engine.connect() as conn:
+            count = conn.exec_driver_sql("SELECT COUNT(*) FROM user_profiles").scalar()
+        assert count == 0
+
+    def test_empty_input(self, tmp_path):
+        service = UserProfileService(db_path=str(tmp_path / "profiles.db"))
+        assert service.get_profiles_bulk([]) == {}
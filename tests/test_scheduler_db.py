@@ -0,0 +1,112 @@
+"""
+Tests for the shared scheduler DB helpers (app/scheduler/db.py).
+
+Runs against the SQLite file configured by settings.database_url; each test
+uses a unique lock key so reruns don't collide.
+"""
+import uuid
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import StaticPool
+
+from app.scheduler.db import (
+    acquire_scheduler_lock, ensure_scheduler_indexes, get_consolidated_users, get_engine, get_sent_reminders,
+    mark_consolidated, mark_reminder_sent, purge_scheduler_locks, purge_sent_reminders
+)
+
+
+class TestAcquireSchedulerLock:
+    """scheduler_locks 主键锁：同一个 key 只能被抢到一次"""
+
+    def test_first_acquire_wins(self):
+        lock_key = f"test:{uuid.uuid4()}"
+
+        assert acquire_scheduler_lock(lock_key) is True
+        assert acquire_scheduler_lock(lock_key) is False
+
+    def test_distinct_keys_are_independent(self):
+        assert acquire_scheduler_lock(f"test:{uuid.uuid4()}") is True
+        assert acquire_scheduler_lock(f"test:{uuid.uuid4()}") is True
+
+    def test_purge_removes_only_expired_locks(self):
+        old_key, new_key = f"test:{uuid.uuid4()}", f"test:{uuid.uuid4()}"
+        acquire_scheduler_lock(old_key)
+        acquire_scheduler_lock(new_key)
+        with get_engine().connect() as conn:
+            conn.exec_driver_sql(
+                "UPDATE scheduler_locks SET created_at = datetime('now', '-8 days') WHERE lock_key = ?",
+                (old_key,)
+            )
+            conn.commit()
+
+        assert purge_scheduler_locks() >= 1
+        assert acquire_scheduler_lock(old_key) is True
+        assert acquire_scheduler_lock(new_key) is False
+
+    def test_busy_database_is_retried(self):
+        engine = MagicMock()
+        conn = engine.connect.return_value.__enter__.return_value
+        conn.execute.side_effect = [
+            OperationalError("INSERT", {}, Exception("database is locked")), MagicMock(rowcount=1)
+        ]
+
+        with patch("app.scheduler.db.get_engine", return_value=engine), \
+             patch("app.scheduler.db._ensure_table_once"):
+            assert acquire_scheduler_lock(f"test:{uuid.uuid4()}") is True
+
+        assert conn.execute.call_count == 2
+
+
+class TestSentReminders:
+    """sent_reminders 去重表：同一次提醒只能登记一次，并可批量读回"""
+
+    def test_mark_once_and_read_back(self):
+        user_id, event_id = f"user:{uuid.uuid4()}", f"event:{uuid.uuid4()}"
+
+        assert mark_reminder_sent(user_id, event_id, "209901011200") is True
+        assert mark_reminder_sent(user_id, event_id, "209901011200") is False
+        assert (user_id, event_id, "209901011200") in get_sent_reminders("209901010000")
+
+    def test_since_filters_older_reminders(self):
+        user_id, event_id = f"user:{uuid.uuid4()}", f"event:{uuid.uuid4()}"
+        mark_reminder_sent(user_id, event_id, "209801011200")
+
+        assert (user_id, event_id, "209801011200") not in get_sent_reminders("209901010000")
+
+    def test_purge_removes_only_expired_reminders(self):
+        user_id = f"user:{uuid.uuid4()}"
+        mark_reminder_sent(user_id, "old", "200001011200")
+        mark_reminder_sent(user_id, "new", "209901011200")
+
+        assert purge_sent_reminders() >= 1
+        assert mark_reminder_sent(user_id, "old", "200001011200") is True
+        assert mark_reminder_sent(user_id, "new", "209901011200") is False
+
+
+class TestMemoryConsolidationCheckpoint:
+    """memory_consolidations 进度表：记录后可按时间读回"""
+
+    def test_mark_and_read_back(self):
+        user_id = f"user:{uuid.uuid4()}"
+
+        mark_consolidated(user_id)
+        mark_consolidated(user_id)
+
+        assert user_id in get_consolidated_users("2000-01-01 00:00:00")
+        assert user_id not in get_consolidated_users("2999-01-01 00:00:00")
+
+
+class TestEnsureSchedulerIndexes:
+    """调度器启动时自行建好事件提醒 JOIN 的 user_profiles 表"""
+
+    def test_creates_user_profiles_table(self):
+        engine = create_engine("sqlite://", poolclass=StaticPool)
+
+        with patch("app.scheduler.db.get_engine", return_value=engine):
+            ensure_scheduler_indexes()
+
+        with engine.connect() as conn:
+            names = {row[0] for row in conn.exec_driver_sql("SELECT name FROM sqlite_master")}
+        assert {"user_profiles", "idx_user_profiles_user_id", "idx_user_profiles_updated_at"} <= names